@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+from itertools import permutations, product
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import sys
+import time
+
+from inputer import IntPuter, Network, Pipe, Program
+from day15 import Droid
+
+# Where baselines are stored unless told otherwise
+DEFAULT_BASELINES = 'bench_baselines.json'
+
+# Registered workloads: name -> (input file, function). Each function runs its workload on IntPuters created with the
+# given options and returns the number of instructions executed.
+WORKLOADS: Dict[str, Tuple[str, Callable[..., int]]] = {}
+
+
+def workload(name: str, filename: str):
+    def register(function: Callable[..., int]) -> Callable[..., int]:
+        WORKLOADS[name] = (filename, function)
+        return function
+    return register
+
+
+@workload('day2', 'day2.txt')
+def day2(program: Program, **options) -> int:
+    # A slice of the noun/verb sweep, run one pair at a time
+    computer = IntPuter(program, Pipe(), Pipe(), **options)
+    for noun, verb in product(range(20), repeat=2):
+        computer.reset()
+        computer.set_loc(1, noun)
+        computer.set_loc(2, verb)
+        computer.run_until_blocked()
+    return computer.instructions
+
+
+@workload('day5', 'day5.txt')
+def day5(program: Program, **options) -> int:
+    computer = IntPuter(program, **options)
+    for system in (1, 5):
+        computer.reset()
+        computer.resume([system])
+    return computer.instructions
+
+
+@workload('day7', 'day7.txt')
+def day7(program: Program, **options) -> int:
+    computers = [IntPuter(program, **options) for _ in range(5)]
+    # Amplifiers in series, each one run to completion in turn
+    for phases in permutations(range(5)):
+        signal = 0
+        for computer, phase in zip(computers, phases):
+            computer.reset()
+            signal = computer.resume([phase, signal])[-1]
+    # Amplifiers in a feedback loop
+    network = Network()
+    for source, destination in zip(computers, computers[1:] + computers[:1]):
+        network.connect(source, destination)
+    for phases in permutations(range(5, 10)):
+        for computer, phase in zip(computers, phases):
+            computer.reset()
+            computer.input_pipe.clear()
+            computer.input_pipe.enqueue(phase)
+        computers[0].input_pipe.enqueue(0)
+        network.run()
+    return sum(computer.instructions for computer in computers)
+
+
+@workload('day9', 'day9.txt')
+def day9(program: Program, **options) -> int:
+    computer = IntPuter(program, **options)
+    for mode in (1, 2):
+        computer.reset()
+        computer.resume([mode])
+    return computer.instructions
+
+
+@workload('day13', 'day13.txt')
+def day13(program: Program, **options) -> int:
+    # Play the whole game, keeping the paddle under the ball
+    computer = IntPuter(program, **options)
+    computer.set_loc(0, 2)
+    paddle, ball = 0, 0
+    outputs = computer.resume()
+    while True:
+        for x, o in zip(outputs[::3], outputs[2::3]):
+            if o == 3:
+                paddle = x
+            elif o == 4:
+                ball = x
+        if computer.ended:
+            break
+        outputs = computer.resume([(paddle < ball) - (paddle > ball)])
+    return computer.instructions
+
+
+@workload('day15', 'day15.txt')
+def day15(program: Program, **options) -> int:
+    computer = IntPuter(program, **options)
+    Droid(computer=computer).map_area()
+    return computer.instructions
+
+
+@workload('day17', 'day17.txt')
+def day17(program: Program, **options) -> int:
+    # Read the camera image
+    computer = IntPuter(program, **options)
+    computer.resume()
+    return computer.instructions
+
+
+def measure(name: str, repeat: int, options: dict) -> Optional[Dict[str, float]]:
+    """
+    Runs a workload repeat times, returning the instruction count and the best wall time and rate. Returns None if the
+    workload's input file isn't available.
+    """
+    filename, function = WORKLOADS[name]
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'r') as f:
+        program = Program(f.readline())
+
+    best = None
+    instructions = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        instructions = function(program, **options)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return {
+        'instructions': instructions,
+        'time': best,
+        'rate': instructions / best if best else 0.0,
+    }
+
+
+def mode_name(options: dict) -> str:
+    """
+    Baselines are kept separately for each combination of IntPuter options.
+    """
+    parts = [name for name in ('compiled', 'paged') if options.get(name)]
+    if not options.get('compact', True):
+        parts.append('list')
+    return '+'.join(parts) or 'interpreted'
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the IntPuter on the programs used by the daily puzzles. Workloads whose input file "
+                    "isn't in the working directory are skipped."
+    )
+    parser.add_argument('workloads', nargs='*', metavar='workload',
+                        help="workloads to run, all of them by default: " + ', '.join(sorted(WORKLOADS)))
+    parser.add_argument('--repeat', type=int, default=3, help="runs per workload, the fastest counts (default 3)")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="fail if a workload's instructions per second drop by more than this fraction of its "
+                             "baseline (default 0.1)")
+    parser.add_argument('--baselines', default=DEFAULT_BASELINES, help="baselines file (default %(default)s)")
+    parser.add_argument('--save', action='store_true', help="store the results as the new baselines")
+    parser.add_argument('--compiled', action='store_true', help="run IntPuters in compiled mode")
+    parser.add_argument('--paged', action='store_true', help="run IntPuters with paged memory")
+    parser.add_argument('--list-memory', action='store_true', help="run IntPuters with list rather than array memory")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.workloads if name not in WORKLOADS]
+    if unknown:
+        parser.error("unknown workloads: {}".format(', '.join(unknown)))
+
+    options = {'compiled': args.compiled, 'paged': args.paged, 'compact': not args.list_memory}
+    mode = mode_name(options)
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, 'r') as f:
+            baselines = json.load(f)
+    mode_baselines = baselines.setdefault(mode, {})
+
+    print("Mode: {}".format(mode))
+    print("{:<8} {:>12} {:>10} {:>14} {:>10}".format('Workload', 'Instructions', 'Time (s)', 'Instr/s', 'Baseline'))
+    regressions = []
+    for name in args.workloads or sorted(WORKLOADS):
+        result = measure(name, args.repeat, options)
+        if result is None:
+            print("{:<8} skipped, no {}".format(name, WORKLOADS[name][0]))
+            continue
+
+        baseline = mode_baselines.get(name)
+        comparison = '-'
+        if baseline is not None:
+            change = result['rate'] / baseline['rate'] - 1
+            comparison = '{:+.1%}'.format(change)
+            if baseline['instructions'] != result['instructions']:
+                # Different input or behaviour, the rates can't be compared
+                comparison = 'changed'
+            elif change < -args.threshold:
+                regressions.append(name)
+                comparison += ' FAIL'
+        print("{:<8} {:>12} {:>10.3f} {:>14,.0f} {:>10}".format(
+            name, result['instructions'], result['time'], result['rate'], comparison
+        ))
+        if args.save:
+            mode_baselines[name] = result
+
+    if args.save:
+        with open(args.baselines, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print("Saved baselines to {}".format(args.baselines))
+        return 0
+    if regressions:
+        print("Regressed by more than {:.0%}: {}".format(args.threshold, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,53 @@
 #!/usr/bin/env python3
+from typing import BinaryIO, Iterator
+
+import numpy as np
+
+# Bytes of the mass list read at a time
+CHUNK_SIZE = 1 << 24
 
 
 def calc_fuel_mass(x):
     return x // 3 - 2
 
 
-def calc_fuel_fuel(x):
-    mass = calc_fuel_mass(x)
-    if mass > 0:
-        return calc_fuel_fuel(mass) + mass
-    else:
-        return 0
+def calc_fuel_fuel(masses: np.ndarray) -> int:
+    """
+    Total fuel for a batch of modules, including the fuel needed to carry the fuel. Rather than recursing for each
+    module, the whole batch takes one step at a time, dropping modules as their extra fuel reaches zero.
+    """
+    total = 0
+    fuel = calc_fuel_mass(masses)
+    while fuel.size:
+        fuel = fuel[fuel > 0]
+        total += int(fuel.sum())
+        fuel = calc_fuel_mass(fuel)
+    return total
+
+
+def read_masses(f: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[np.ndarray]:
+    """
+    Reads a list of masses, one per line, as a stream of arrays of about chunk_size bytes each. Only one chunk is held
+    in memory at a time.
+    """
+    rest = b''
+    while True:
+        data = f.read(chunk_size)
+        if not data:
+            break
+        data = rest + data
+        # The last line may carry on in the next chunk, keep it back until then
+        end = data.rfind(b'\n') + 1
+        rest = data[end:]
+        yield np.fromstring(data[:end], dtype=np.int64, sep=' ')
+    yield np.fromstring(rest, dtype=np.int64, sep=' ')
 
 
-with open('day1.txt', 'r') as f:
-    mass_list = [int(line) for line in f.readlines()]
+part1, part2 = 0, 0
+with open('day1.txt', 'rb') as f:
+    for masses in read_masses(f):
+        part1 += int(calc_fuel_mass(masses).sum())
+        part2 += calc_fuel_fuel(masses)
 
-print("Part 1:", sum(calc_fuel_mass(m) for m in mass_list))
-print("Part 2:", sum(calc_fuel_fuel(m) for m in mass_list))
+print("Part 1:", part1)
+print("Part 2:", part2)
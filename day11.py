@@ -1,16 +1,14 @@
 #!/usr/bin/env python3
-import asyncio
 from typing import Dict, Tuple
 
-from inputer import IntPuter, Pipe
+from inputer import IntPuter
 
 Location = Tuple[int, int]
 
 
 class Robot:
-    def __init__(self, in_pipe: Pipe, out_pipe: Pipe):
-        self.input_pipe: Pipe = in_pipe
-        self.output_pipe: Pipe = out_pipe
+    def __init__(self, computer: IntPuter):
+        self.computer: IntPuter = computer
         self.location: Location = (0, 0)
         self.direction: int = 0
         self.painted: Dict[Location, int] = {}
@@ -30,51 +28,38 @@ class Robot:
         else:
             self.location = (self.location[0] - 1, self.location[1])
 
-    async def robot(self):
-        while True:
-            # Read current space into input queue
-            current = self.painted.get(self.location, 0)
-            # Send to IntPuter
-            self.input_pipe.enqueue(current)
-            # Read new colour and do paint
-            paint = await self.output_pipe.dequeue()
-            self.painted[self.location] = paint
-            # Read move
-            move = await self.output_pipe.dequeue()
+    def robot(self):
+        while not self.computer.ended:
+            # Send the current space to the IntPuter, and read back the new colour and move
+            outputs = self.computer.resume([self.painted.get(self.location, 0)])
+            for paint, move in zip(outputs[::2], outputs[1::2]):
+                self.painted[self.location] = paint
 
-            if move:
-                self.direction = (self.direction + 1) % 4
-            else:
-                self.direction = (self.direction - 1) % 4
+                if move:
+                    self.direction = (self.direction + 1) % 4
+                else:
+                    self.direction = (self.direction - 1) % 4
 
-            self.step()
+                self.step()
 
 
-loop = asyncio.new_event_loop()
-asyncio.set_event_loop(loop)
-
 with open("day11.txt", "r") as f:
     code = f.readline()
 
-input_pipe, output_pipe = Pipe(), Pipe()
-computer = IntPuter(code, input_pipe, output_pipe)
+computer = IntPuter(code)
 
-robot = Robot(input_pipe, output_pipe)
-loop.create_task(robot.robot())
-loop.run_until_complete(computer.run_async())
+robot = Robot(computer)
+robot.robot()
 
 print("Part 1:", len(robot.painted))
 
 # Reset systems
-input_pipe.clear()
-output_pipe.clear()
 computer.reset()
 robot.reset()
 # Set initial point to a white square
 robot.painted[(0, 0)] = 1
-# Run tasks
-loop.create_task(robot.robot())
-loop.run_until_complete(computer.run_async())
+# Run robot
+robot.robot()
 
 # Calculate image size and offsets
 xs, ys = [set(x) for x in zip(*robot.painted.keys())]
@@ -1,15 +1,13 @@
 #!/usr/bin/env python3
 from typing import List
 
-from inputer import IntPuter, Pipe
-import asyncio
+from inputer import IntPuter
 
 
-class Display(Pipe):
+class Display:
 
-    def __init__(self, input_pipe: Pipe):
-        super().__init__()
-        self.input_pipe: Pipe = input_pipe
+    def __init__(self, computer: IntPuter):
+        self.computer: IntPuter = computer
         self.state: List[List[int]] = []
         self.score: int = 0
         self.location: int = 0
@@ -18,19 +16,11 @@ class Display(Pipe):
     def remaining_blocks(self) -> int:
         return sum([row.count(2) for row in self.state])
 
-    async def dequeue(self) -> int:
+    def joystick(self) -> int:
         return int((self.location < self.ball) - (self.location > self.ball))
 
-    async def run(self):
-        first_run = True
-        while self.remaining_blocks() or first_run:
-            x = await self.input_pipe.dequeue()
-            y = await self.input_pipe.dequeue()
-            o = await self.input_pipe.dequeue()
-
-            if first_run and o == 2:
-                first_run = False
-
+    def update(self, outputs: List[int]):
+        for x, y, o in zip(outputs[::3], outputs[1::3], outputs[2::3]):
             if x < 0:
                 self.score = o
                 continue
@@ -50,29 +40,23 @@ class Display(Pipe):
             elif o == 4:
                 self.ball = x
 
-        x = await self.input_pipe.dequeue()
-        y = await self.input_pipe.dequeue()
-        o = await self.input_pipe.dequeue()
-        self.score = o
-
+    def run(self):
+        # Draw the initial screen, then keep moving the joystick towards the ball until the game ends
+        self.update(self.computer.resume())
+        while not self.computer.ended:
+            self.update(self.computer.resume([self.joystick()]))
 
-loop = asyncio.new_event_loop()
-asyncio.set_event_loop(loop)
 
-output_pipe = Pipe()
-display = Display(output_pipe)
 with open("day13.txt", "r") as f:
-    computer = IntPuter(f.readline(), display, output_pipe)
+    computer = IntPuter(f.readline())
 
-task = loop.create_task(display.run())
-loop.run_until_complete(computer.run_async())
-task.cancel()
+display = Display(computer)
+display.run()
 
 print("Part 1:", display.remaining_blocks())
 
 computer.reset()
-output_pipe.clear()
 computer.set_loc(0, 2)
-loop.run_until_complete(asyncio.gather(computer.run_async(), display.run()))
+display.run()
 
 print("Part 2:", display.score)
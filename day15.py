@@ -1,10 +1,9 @@
 #!/usr/bin/env python3
-import asyncio
 from dataclasses import dataclass, field
 from math import inf
 from typing import List, Tuple, Dict, Set
 
-from inputer import IntPuter, Pipe
+from inputer import IntPuter
 
 Location = Tuple[int, int]
 
@@ -17,10 +16,8 @@ class Droid:
     location: Location = (0, 0)
     # Oxygen Location
     oxygen_location: Location = (0, 0)
-    # Pipe to receive output from IntPuter
-    input_pipe: Pipe = field(default_factory=Pipe)
-    # Pipe to send output to IntPuter
-    output_pipe: Pipe = field(default_factory=Pipe)
+    # IntPuter controlling the droid
+    computer: IntPuter = None
 
     # Location type values
     UNKNOWN = -1
@@ -55,7 +52,7 @@ class Droid:
             (location[0] + 1, location[1]),
         ]
 
-    async def map_area(self) -> None:
+    def map_area(self) -> None:
         """
         Depth-first search to map the entire area. Takes nothing, returns nothing, updates self.grid
         """
@@ -91,10 +88,8 @@ class Droid:
                     else:
                         move = Droid.SOUTH
 
-            # Send the move command
-            self.output_pipe.enqueue(move)
-            # Wait for the response
-            result: int = await self.input_pipe.dequeue()
+            # Send the move command and read the response
+            result: int = self.computer.resume([move])[0]
             # Update the grid with the result
             self.grid[next_location] = result
             # If we've found the oxygen location, save that for later
@@ -141,24 +136,14 @@ class Droid:
         return distance
 
 if __name__ == "__main__":
-    # Set up asyncio
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    # Communication pipes
-    input_pipe, output_pipe = Pipe(), Pipe()
-
     # Load IntPuter code
     with open("day15.txt", "r") as f:
-        computer = IntPuter(f.readline(), input_pipe, output_pipe)
+        computer = IntPuter(f.readline())
 
     # Create Droid instance
-    droid = Droid(input_pipe=output_pipe, output_pipe=input_pipe)
-    # Start computer
-    task = loop.create_task(computer.run_async())
+    droid = Droid(computer=computer)
     # Run until mapping is complete
-    loop.run_until_complete(droid.map_area())
-    # Kill computer
-    task.cancel()
+    droid.map_area()
 
     # Shorted route from Origin (0,0) to the oxygen location
     print("Part 1:", droid.shortest_route(droid.oxygen_location, (0, 0)))
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
-from typing import List, Tuple, Dict
+from typing import Iterable, List, Tuple, Dict
 
-from inputer import IntPuter, Pipe
+from inputer import IntPuter
+from intascii import AsciiAdapter
 from day15 import Droid
 
 Location = Tuple[int, int]
@@ -20,20 +21,15 @@ class Day17Droid(Droid):
         return [k for k, v in self.grid.items() if v == self.EMPTY and len(
             [l for l in self.next_locations(k) if self.grid.get(l, self.UNKNOWN) == self.EMPTY]) == 4]
 
-    def load_grid(self, data: List[int]):
-        x, y = 0, 0
-        for i in data:
-            if i == self.UNKNOWN:
-                y += 1
-                x = 0
-                print()
-            else:
+    def load_grid(self, rows: Iterable[str]):
+        for y, row in enumerate(rows):
+            for x, char in enumerate(row):
+                i = ord(char)
                 if i in self.DROID:
                     self.location = (x, y)
                     self.direction = self.DROID.index(i)
                 self.grid[(x, y)] = i
-                x += 1
-                print(chr(i), end='')
+            print(row)
 
     def next_locations(self, location: Location = None) -> List[Location]:
         """
@@ -105,34 +101,23 @@ class Day17Droid(Droid):
         return instructions, commands
 
 
-input_pipe, output_pipe = Pipe(), Pipe()
 with open("day17.txt", "r") as f:
-    computer = IntPuter(f.readline(), input_pipe, output_pipe)
+    computer = IntPuter(f.readline())
+terminal = AsciiAdapter(computer)
 
-computer.run()
 droid = Day17Droid()
-droid.load_grid(computer.output_pipe.data)
+droid.load_grid(terminal.lines())
 intersections = droid.find_intersections()
 print("Part 1:", sum([x * y for x, y in intersections]))
 
-output_pipe.clear()
 computer.reset()
 
 instructions, commands = droid.compress_commands()
 print(instructions, commands)
 
-for i in instructions:
-    input_pipe.enqueue(ord(i))
-input_pipe.enqueue(droid.UNKNOWN)
-for command in ['A', 'B', 'C']:
-    for i in commands[command]:
-        input_pipe.enqueue(ord(i))
-    input_pipe.enqueue(droid.UNKNOWN)
-
-
 computer.set_loc(0, 2)
-computer.run()
-
-print(output_pipe.data)
+terminal.send_lines([instructions] + [commands[command] for command in ['A', 'B', 'C']])
+print(terminal.run())
+print(terminal.values)
 
 print(droid.compress_commands())
@@ -1,26 +1,29 @@
 #!/usr/bin/env python3
 from inputer import IntPuter
-from itertools import product
+from intsearch import search_patch
+from intsymbolic import Unsupported, solve_patch
 
-with open('day2.txt', 'r') as f:
-    computer = IntPuter(f.readline())
+if __name__ == "__main__":
+    # Guarded so the worker processes of the search can import this script without running it again
+    with open('day2.txt', 'r') as f:
+        computer = IntPuter(f.readline())
 
-# Part 1
-computer.set_loc(1, 12)
-computer.set_loc(2, 2)
-result = computer.run()
-print("Part 1:", result[0])
+    # Part 1
+    computer.set_loc(1, 12)
+    computer.set_loc(2, 2)
+    result = computer.run()
+    print("Part 1:", result[0])
 
-# Part 2
-for i, j in product(range(len(computer.code)), repeat=2):
-    computer.reset()
-    computer.set_loc(1, i)
-    computer.set_loc(2, j)
+    # Part 2
+    # Run the program once with the noun and verb as symbols, which gives address 0 as a polynomial in them that can
+    # be solved directly. Either way the first match is the same one a sequential search through
+    # product(range(n), repeat=2) would find.
+    n = len(computer.code)
     try:
-        this_run = computer.run()
-    except (KeyError, IndexError):
-        pass
-    else:
-        if this_run[0] == 19690720:
-            print("Part 2:", i * 100 + j)
-            break
+        solution = solve_patch(computer.program, [1, 2], 0, 19690720, [range(n), range(n)])
+    except Unsupported:
+        # The program branches on the noun or verb, so run every pair on all the cores. Pairs which crash are skipped,
+        # and the instruction limit stops any pair which loops forever.
+        solution = search_patch(computer.program, [1, 2], 0, 19690720, [range(n), range(n)])
+    if solution is not None:
+        print("Part 2:", solution[0] * 100 + solution[1])
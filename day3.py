@@ -1,40 +1,180 @@
 #!/usr/bin/env python3
-from itertools import product
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+Point = Tuple[int, int]
+
+
+@dataclass
+class Segment:
+    """
+    A straight horizontal or vertical section of a wire.
+    """
+    wire: int
+    # The coordinate that doesn't change along the segment, y for a horizontal segment and x for a vertical one
+    level: int
+    # The other coordinate where the segment starts and ends, in the direction the wire runs
+    start: int
+    end: int
+    # Steps along the wire to the start of the segment
+    steps: int
+
+    @property
+    def low(self) -> int:
+        return min(self.start, self.end)
+
+    @property
+    def high(self) -> int:
+        return max(self.start, self.end)
+
+    def steps_to(self, position: int) -> int:
+        """
+        Steps along the wire to the given position on this segment.
+        """
+        return self.steps + abs(position - self.start)
+
+
+class Counts:
+    """
+    A Fenwick tree counting the horizontal segments active at each y coordinate, which can find the next occupied
+    coordinate in O(log n).
+    """
+
+    def __init__(self, size: int):
+        self.tree: List[int] = [0] * (size + 1)
+
+    def add(self, index: int, delta: int) -> None:
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix(self, index: int) -> int:
+        """
+        Count of everything up to and including index.
+        """
+        total = 0
+        index += 1
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def find(self, rank: int) -> int:
+        """
+        The smallest index with a prefix count of at least rank, or the size if there isn't one.
+        """
+        index = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            if index + step < len(self.tree) and self.tree[index + step] < rank:
+                index += step
+                rank -= self.tree[index]
+            step >>= 1
+        return index
 
-with open('day3.txt', 'r') as f:
-    initial = f.readlines()
 
-lines = []
-for code in initial:
-    line = []
-    for instr in code.split(","):
+def parse_wire(wire: int, path: str) -> Tuple[List[Segment], List[Segment]]:
+    """
+    Splits a wire's path into its horizontal and vertical segments.
+    """
+    horizontal, vertical = [], []
+    x, y, steps = 0, 0, 0
+    for instr in path.split(","):
         direction = instr[0]
         mag = int(instr[1:])
-        if not line:
-            prev = (0, 0, 0)
-        else:
-            prev = line[-1][1]
         if direction == "U":
-            new = (prev[0], prev[1] + mag, prev[2] + mag)
+            vertical.append(Segment(wire, x, y, y + mag, steps))
+            y += mag
         elif direction == "D":
-            new = (prev[0], prev[1] - mag, prev[2] + mag)
+            vertical.append(Segment(wire, x, y, y - mag, steps))
+            y -= mag
         elif direction == "R":
-            new = (prev[0] + mag, prev[1], prev[2] + mag)
+            horizontal.append(Segment(wire, y, x, x + mag, steps))
+            x += mag
         else:
-            new = (prev[0] - mag, prev[1], prev[2] + mag)
-        line.append((prev, new))
-    lines.append(line)
-
-intersections = []
-for x, y in product(*lines):
-    # Are lines the same orientation?
-    if (x[0][0] == x[1][0] and y[0][0] == y[0][1]) or (x[0][1] == x[1][1] and y[0][1] == y[1][1]):
-        continue
-    xs, ys = sorted(x), sorted(y)
-    if (xs[0][0] <= ys[0][0] <= xs[1][0]) \
-            and (ys[0][1] <= xs[0][1] <= ys[1][1]):
-        dist = x[0][2] + abs(x[0][0] - y[0][0]) + y[0][2] + abs(y[0][1] - x[0][1])
-        intersections.append((ys[0][0], xs[0][1], dist))
-
-print("Part 1:", sorted([abs(x) + abs(y) for x, y, z in intersections])[0])
-print("Part 2:", sorted([z for x, y, z in intersections])[0])
+            horizontal.append(Segment(wire, y, x, x - mag, steps))
+            x -= mag
+        steps += mag
+    return horizontal, vertical
+
+
+def find_crossings(paths: List[str]) -> Dict[Point, Dict[int, int]]:
+    """
+    Finds every point other than the origin where a horizontal segment of one wire crosses a vertical segment of another,
+    for any number of wires. Returns the fewest steps each wire takes to reach each crossing. Wires running along each
+    other for a stretch don't cross there.
+
+    A vertical line sweeps across the grid from left to right. Horizontal segments become active as the sweep reaches
+    their left end and stop being active after their right end. Each vertical segment looks up the active segments of
+    every other wire within its span. Each wire has its own Fenwick tree over the y coordinates of its segments, which
+    finds them without visiting any empty coordinates, or any segments of the vertical's own wire. That takes
+    O((n * w + k) log n) for n segments of w wires and k crossings, rather than comparing every pair of segments.
+    """
+    horizontal, vertical = [], []
+    for wire, path in enumerate(paths):
+        h, v = parse_wire(wire, path)
+        horizontal += h
+        vertical += v
+
+    # Events in sweep order. At the same x, segments are added before the lookups and removed after them, so crossings
+    # at the ends of segments are found.
+    events = []
+    for i, segment in enumerate(horizontal):
+        events.append((segment.low, 0, i))
+        events.append((segment.high, 2, i))
+    for i, segment in enumerate(vertical):
+        events.append((segment.level, 1, i))
+    events.sort()
+
+    # The y coordinates of each wire's horizontal segments, a tree counting the active ones at each coordinate and the
+    # active segments themselves, by index into the wire's coordinates
+    levels: Dict[int, List[int]] = {}
+    for segment in horizontal:
+        levels.setdefault(segment.wire, []).append(segment.level)
+    for wire in levels:
+        levels[wire] = sorted(set(levels[wire]))
+    counts = {wire: Counts(len(wire_levels)) for wire, wire_levels in levels.items()}
+    active: Dict[int, Dict[int, Dict[int, Segment]]] = {wire: {} for wire in levels}
+
+    crossings: Dict[Point, Dict[int, int]] = {}
+    for x, kind, i in events:
+        if kind == 0 or kind == 2:
+            segment = horizontal[i]
+            index = bisect_left(levels[segment.wire], segment.level)
+            if kind == 0:
+                active[segment.wire].setdefault(index, {})[i] = segment
+                counts[segment.wire].add(index, 1)
+            else:
+                del active[segment.wire][index][i]
+                counts[segment.wire].add(index, -1)
+            continue
+
+        segment = vertical[i]
+        for other_wire, wire_levels in levels.items():
+            if other_wire == segment.wire:
+                continue
+            first = bisect_left(wire_levels, segment.low)
+            last = bisect_right(wire_levels, segment.high) - 1
+            seen = counts[other_wire].prefix(first - 1) if first else 0
+            while True:
+                index = counts[other_wire].find(seen + 1)
+                if index > last:
+                    break
+                for other in active[other_wire][index].values():
+                    y = other.level
+                    if (x, y) == (0, 0):
+                        continue
+                    steps = crossings.setdefault((x, y), {})
+                    for wire, count in ((segment.wire, segment.steps_to(y)), (other.wire, other.steps_to(x))):
+                        steps[wire] = min(steps.get(wire, count), count)
+                seen += len(active[other_wire][index])
+    return crossings
+
+
+with open('day3.txt', 'r') as f:
+    crossings = find_crossings([line.strip() for line in f if line.strip()])
+
+print("Part 1:", min(abs(x) + abs(y) for x, y in crossings))
+print("Part 2:", min(sum(steps.values()) for steps in crossings.values()))
@@ -1,39 +1,48 @@
 #!/usr/bin/env python3
+from functools import lru_cache
 
 r = [171309, 643603]
 
 
-def incr_only(num):
-    prev = 0
-    for i in [int(i) for i in str(num)]:
-        if i < prev:
-            return False
-        prev = i
-    return True
-
-
-def contains_double(num):
-    s = str(num)
-    for patt in [str(i) for i in range(11, 121, 11)]:
-        if patt in s:
-            return True
-    return False
-
-
-def contains_double_exact(num):
-    s = str(num)
-    for x in range(10):
-        dbl = str(x * 11)
-        trp = str(x * 111)
-        if dbl in s and trp not in s:
-            return True
-    return False
+def count_codes(limit: int, exact: bool) -> int:
+    """
+    Counts the codes from 0 up to and including limit whose digits never decrease and which have a pair of matching
+    adjacent digits. With exact, the pair mustn't be part of a longer run of the same digit.
+
+    Rather than checking each number, this builds the numbers a digit at a time from the left, counting how many ways
+    each partial number can be finished. A partial number only matters for its last digit, the length of the run it
+    ends with, whether it already has a pair and whether it's still level with the start of limit, so there are only a
+    few hundred states per digit whatever the size of the range.
+    """
+    if limit < 0:
+        return 0
+    digits = [int(d) for d in str(limit)]
+
+    def pair(run: int) -> bool:
+        return run == 2 if exact else run >= 2
+
+    @lru_cache(maxsize=None)
+    def count(pos: int, prev: int, run: int, found: bool, tight: bool) -> int:
+        # prev is -1 until the first non-zero digit, leading zeros aren't part of the code
+        if pos == len(digits):
+            return int(prev >= 0 and (found or pair(run)))
+        top = digits[pos] if tight else 9
+        total = 0
+        for d in range(max(prev, 0), top + 1):
+            if prev < 0 and d == 0:
+                total += count(pos + 1, -1, 0, False, tight and d == top)
+            elif d == prev:
+                # Runs longer than 3 look the same as 3 to both rules
+                total += count(pos + 1, d, min(run + 1, 3), found, tight and d == top)
+            else:
+                total += count(pos + 1, d, 1, found or pair(run), tight and d == top)
+        return total
+
+    return count(0, -1, 0, False, True)
 
 
 # Part 1
-codes = [x for x in range(*r) if incr_only(x) and contains_double(x)]
-print(len(codes))
+print(count_codes(r[1] - 1, False) - count_codes(r[0] - 1, False))
 
 # Part 2
-codes = [x for x in range(*r) if incr_only(x) and contains_double_exact(x)]
-print(len(codes))
+print(count_codes(r[1] - 1, True) - count_codes(r[0] - 1, True))
@@ -1,18 +1,20 @@
 #!/usr/bin/env python3
 from inputer import IntPuter, Pipe
+from intcache import RunCache
 
 input_pipe, output_pipe = Pipe(), Pipe()
+cache = RunCache()
 
 with open('day5.txt', 'r') as f:
     computer = IntPuter(f.readline(), input_pipe, output_pipe)
 
 input_pipe.enqueue(1)
-computer.run()
+cache.run(computer)
 print("Part 1:", output_pipe.data[-1])
 
 input_pipe.clear()
 output_pipe.clear()
 input_pipe.enqueue(5)
 computer.reset()
-computer.run()
+cache.run(computer)
 print("Part 2:", output_pipe.data[-1])
@@ -1,64 +1,15 @@
 #!/usr/bin/env python3
-from itertools import permutations
-from inputer import IntPuter, Pipe
-import asyncio
+from inputer import Program
+from intchain import best_feedback_parallel, best_series, chain
 
-with open('day7.txt', 'r') as f:
-    code = f.readline()
+if __name__ == "__main__":
+    with open('day7.txt', 'r') as f:
+        code = Program(f.readline())
 
-computers = []
-last_pipe = Pipe()
-for i in range(5):
-    next_pipe = Pipe()
-    computers.append(
-        IntPuter(code, last_pipe, next_pipe)
-    )
-    last_pipe = next_pipe
+    best_result, best_settings = best_series(chain(code, 5), range(0, 5))
+    print("Part 1:", best_result)
 
-best_result = 0
-best_settings = []
-
-for p in permutations(range(0, 5)):
-    for i, c in enumerate(computers):
-        c.reset()
-        c.input_pipe.clear()
-        c.input_pipe.enqueue(p[i])
-
-    computers[0].input_pipe.enqueue(0)
-    computers[4].output_pipe.clear()
-
-    for c in computers:
-        c.run()
-
-    result = computers[-1].output_pipe.peek()
-    if result > best_result:
-        best_result = result
-        best_settings = p
-
-print("Part 1:", best_result)
-
-computers[0].input_pipe = computers[-1].output_pipe
-best_result = 0
-best_settings = []
-
-loop = asyncio.new_event_loop()
-asyncio.set_event_loop(loop)
-for p in permutations(range(5, 10)):
-    for i, c in enumerate(computers):
-        c.reset()
-        c.input_pipe.clear()
-        c.input_pipe.enqueue(p[i])
-
-    computers[0].input_pipe.enqueue(0)
-
-    tasks = asyncio.gather(*[
-        c.run_async() for c in computers
-    ])
-    loop.run_until_complete(tasks)
-
-    result = computers[-1].output_pipe.peek()
-    if result > best_result:
-        best_result = result
-        best_settings = p
-
-print("Part 2:", best_result)
+    # Five amplifiers are searched in this process. Longer chains are spread over a pool of worker processes, which
+    # import this script again, hence the guard.
+    best_result, best_settings = best_feedback_parallel(code, range(5, 10))
+    print("Part 2:", best_result)
@@ -1,11 +1,25 @@
 #!/usr/bin/env python3
+from array import array
+from collections import deque
 from dataclasses import field, dataclass
-from functools import partial
-from typing import Tuple, List, Dict
+from enum import Enum
+from typing import Tuple, List, Dict, Set, Callable, Optional, Deque, Iterable, Union
 import asyncio
-import inspect
+import copy
+import hashlib
+import json
+import mmap
+import struct
+import sys
+import time
+
+from intcompiler import COMPILED_OPCODES, Block, compile_block
 
 Val = Tuple[int, int]
+# A run of memory cells: an array of 64 bit integers, or a list once it has to hold larger numbers
+Cells = Union[array, List[int]]
+# A decoded instruction: handler, bound parameters, instruction size and the raw memory cells it was decoded from
+Decoded = Tuple[Callable, Tuple[Val, ...], int, Tuple[int, ...]]
 
 
 @dataclass
@@ -13,17 +27,91 @@ class Pipe:
     """
     This class facilitates communication between multiple IntPuter processes or an IntPuter and peripheral devices.
 
-    Internally, it uses a list to store queued data and a semaphore to block if there is no available data to read.
+    Internally, it uses a deque to store queued data and futures to wake a reader waiting for data to arrive, or a
+    writer waiting for space. Reads never touch the event loop while there is data queued. Pipes support a single
+    waiting reader and a single waiting writer at a time.
+
+    A pipe can optionally be given a capacity. IntPuters writing to a full pipe stop with WAITING_OUTPUT until a reader
+    makes space, which keeps memory flat when a fast producer feeds a slow consumer. enqueue itself never blocks and
+    ignores the capacity, async producers which should respect it can use put.
     """
-    semaphore: asyncio.Semaphore = field(default_factory=partial(asyncio.Semaphore, 0))
-    data: List[int] = field(default_factory=list)
+    data: Deque[int] = field(default_factory=deque)
+    # Maximum number of queued items, None for unbounded
+    capacity: Optional[int] = None
+    waiter: Optional[asyncio.Future] = field(default=None, repr=False)
+    space_waiter: Optional[asyncio.Future] = field(default=None, repr=False)
+    # Queue statistics: items added and removed, the deepest the queue has been and how often a writer found it full
+    enqueued: int = field(default=0, repr=False)
+    dequeued: int = field(default=0, repr=False)
+    max_depth: int = field(default=0, repr=False)
+    full_waits: int = field(default=0, repr=False)
+
+    async def wait_for(self, count: int = 1) -> None:
+        """
+        Wait until there are at least count items queued.
+        """
+        while len(self.data) < count:
+            self.waiter = asyncio.get_running_loop().create_future()
+            await self.waiter
+
+    async def wait_for_space(self) -> None:
+        """
+        Wait until there is space for at least one more item.
+        """
+        if self.full():
+            self.full_waits += 1
+        while self.full():
+            self.space_waiter = asyncio.get_running_loop().create_future()
+            await self.space_waiter
 
     async def dequeue(self) -> int:
         """
         Get the first stored item, waiting for data if there isn't any
         """
-        await self.semaphore.acquire()
-        return self.data.pop(0)
+        if not self.data:
+            await self.wait_for(1)
+        self.dequeued += 1
+        val = self.data.popleft()
+        if self.space_waiter is not None:
+            self.wake_writer()
+        return val
+
+    async def dequeue_many(self, count: int) -> List[int]:
+        """
+        Get the first count stored items, waiting until that many are available. Handy for peripherals which read
+        pairs or triples of values at a time.
+        """
+        if len(self.data) < count:
+            await self.wait_for(count)
+        popleft = self.data.popleft
+        items = [popleft() for _ in range(count)]
+        self.dequeued += count
+        if self.space_waiter is not None:
+            self.wake_writer()
+        return items
+
+    def dequeue_nowait(self) -> Optional[int]:
+        """
+        Get the first stored item without waiting. Returns None if there is no data available.
+        """
+        if self.data:
+            self.dequeued += 1
+            val = self.data.popleft()
+            if self.space_waiter is not None:
+                self.wake_writer()
+            return val
+        return None
+
+    def drain(self) -> List[int]:
+        """
+        Get all stored items without waiting, leaving the queue empty.
+        """
+        items = list(self.data)
+        self.data.clear()
+        self.dequeued += len(items)
+        if self.space_waiter is not None:
+            self.wake_writer()
+        return items
 
     def peek(self) -> int:
         """
@@ -32,19 +120,369 @@ class Pipe:
         if self.data:
             return self.data[0]
 
+    def full(self) -> bool:
+        """
+        Whether the queue has reached its capacity.
+        """
+        return self.capacity is not None and len(self.data) >= self.capacity
+
     def enqueue(self, val: int) -> None:
         """
-        Add a new item to the back of the queue
+        Add a new item to the back of the queue, waking the reader if one is waiting
         """
         self.data.append(val)
-        self.semaphore.release()
+        self.enqueued += 1
+        if len(self.data) > self.max_depth:
+            self.max_depth = len(self.data)
+        if self.waiter is not None:
+            self.wake()
+
+    def enqueue_many(self, vals: Iterable[int]) -> None:
+        """
+        Add several items to the back of the queue in one go, waking the reader if one is waiting
+        """
+        depth = len(self.data)
+        self.data.extend(vals)
+        self.enqueued += len(self.data) - depth
+        if len(self.data) > self.max_depth:
+            self.max_depth = len(self.data)
+        if self.waiter is not None:
+            self.wake()
+
+    async def put(self, val: int) -> None:
+        """
+        Add a new item to the back of the queue, waiting for space first if the queue is full
+        """
+        if self.full():
+            await self.wait_for_space()
+        self.enqueue(val)
+
+    def wake(self) -> None:
+        """
+        Wake the waiting reader, it checks for itself whether enough data has arrived.
+        """
+        if not self.waiter.done():
+            self.waiter.set_result(None)
+        self.waiter = None
+
+    def wake_writer(self) -> None:
+        """
+        Wake the waiting writer, it checks for itself whether there is space.
+        """
+        if not self.space_waiter.done():
+            self.space_waiter.set_result(None)
+        self.space_waiter = None
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Queue statistics, including the current depth.
+        """
+        return {
+            'depth': len(self.data),
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'dequeued': self.dequeued,
+            'full_waits': self.full_waits,
+        }
 
     def clear(self) -> None:
         """
-        Clear the data list and re-create the semaphore to use in a second run.
+        Clear the queue and abandon any waiting reader or writer so the pipe can be used in a second run.
         """
         self.data.clear()
-        self.semaphore = asyncio.Semaphore(0)
+        self.waiter = None
+        self.space_waiter = None
+
+    def fork(self) -> 'Pipe':
+        """
+        Returns a copy of this pipe with its own copy of the queued data and no waiting reader or writer.
+        """
+        pipe = copy.copy(self)
+        pipe.data = deque(self.data)
+        pipe.waiter = None
+        pipe.space_waiter = None
+        return pipe
+
+
+class Program:
+    """
+    A parsed IntCode program. Programs are parsed once and can be shared by any number of IntPuters as their read-only
+    initial memory image. The image is stored as a compact array of 64 bit integers, or a list if the program contains
+    numbers too large for that.
+
+    Programs compare and hash by content, so they can be used as dictionary keys.
+    """
+
+    def __init__(self, source: str):
+        self.set_values([int(x) for x in source.split(',')])
+
+    @classmethod
+    def from_values(cls, values: Iterable[int]) -> 'Program':
+        """
+        Builds a program from a sequence of already parsed values.
+        """
+        program = cls.__new__(cls)
+        program.set_values(list(values))
+        return program
+
+    def set_values(self, values: List[int]) -> None:
+        try:
+            self.image: Cells = array('q', values)
+        except OverflowError:
+            self.image = values
+        self.digest: str = hashlib.sha256(','.join(map(str, values)).encode()).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.image)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Program) and self.digest == other.digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+    def load(self) -> Cells:
+        """
+        Returns a fresh copy of the program image, ready to be used as memory. This is a single buffer copy for an array.
+        """
+        return self.image[::]
+
+
+class PagedMemory:
+    """
+    Sparse memory for an IntPuter. Memory is split into fixed size pages which are only allocated when first written
+    to. Reads from pages which have never been written come from the initial program image, or are 0 beyond the end of
+    it, so a program touching a very high address only costs a single page.
+
+    Supports the subset of list behaviour the IntPuter uses: indexing, slicing and len, where the length is the highest
+    address accessed so far.
+
+    Pages can be shared between copies of a memory, see fork. A shared page is copied the first time either side writes
+    to it, so each page is only ever written in place by the memory that owns it.
+    """
+    PAGE_BITS: int = 10
+    PAGE_SIZE: int = 1 << PAGE_BITS
+    PAGE_MASK: int = PAGE_SIZE - 1
+
+    def __init__(self, image: Cells):
+        # Initial program image, never written to
+        self.image: Cells = image
+        # Allocated pages, keyed by page number
+        self.pages: Dict[int, Cells] = {}
+        # Pages owned by this memory which can be written in place, a subset of pages
+        self.owned: Dict[int, Cells] = {}
+        # Highest address accessed so far, plus one
+        self.size: int = len(image)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, addr):
+        if isinstance(addr, slice):
+            return [self[i] for i in range(*addr.indices(self.size))]
+        page = self.pages.get(addr >> self.PAGE_BITS)
+        if page is not None:
+            return page[addr & self.PAGE_MASK]
+        if addr < 0:
+            raise IndexError("Negative memory address {}".format(addr))
+        if addr < len(self.image):
+            return self.image[addr]
+        return 0
+
+    def __setitem__(self, addr: int, value: int) -> None:
+        page_number = addr >> self.PAGE_BITS
+        page = self.owned.get(page_number)
+        if page is None:
+            if addr < 0:
+                raise IndexError("Negative memory address {}".format(addr))
+            # Take a private copy of a shared page, or load a fresh one
+            shared = self.pages.get(page_number)
+            page = shared[::] if shared is not None else self.load_page(page_number)
+            self.pages[page_number] = page
+            self.owned[page_number] = page
+        try:
+            page[addr & self.PAGE_MASK] = value
+        except OverflowError:
+            # Too big for a 64 bit array, switch this page to a list
+            page = page.tolist()
+            self.pages[page_number] = page
+            self.owned[page_number] = page
+            page[addr & self.PAGE_MASK] = value
+        if addr >= self.size:
+            self.size = addr + 1
+
+    def load_page(self, page_number: int) -> Cells:
+        """
+        Builds a fresh copy of a page from the program image, padded with zeros.
+        """
+        start = page_number << self.PAGE_BITS
+        page = self.image[start:start + self.PAGE_SIZE]
+        if isinstance(page, array):
+            page.frombytes(bytes(page.itemsize * (self.PAGE_SIZE - len(page))))
+        else:
+            page.extend([0] * (self.PAGE_SIZE - len(page)))
+        return page
+
+    def reset(self) -> Set[int]:
+        """
+        Restores the initial program image by dropping every allocated page. Returns the numbers of the pages that were
+        dropped, as those are the only ones which can differ from the image.
+        """
+        touched = set(self.pages)
+        self.pages = {}
+        self.owned = {}
+        self.size = len(self.image)
+        return touched
+
+    def share(self) -> Dict[int, Cells]:
+        """
+        Returns the current pages for sharing with a snapshot or another memory. Every page becomes shared, so the next
+        write to any of them takes a copy first.
+        """
+        self.owned = {}
+        return dict(self.pages)
+
+    def fork(self) -> 'PagedMemory':
+        """
+        Returns an independent copy of this memory, sharing every page until one side writes to it.
+        """
+        memory = PagedMemory(self.image)
+        memory.pages = self.share()
+        memory.size = self.size
+        return memory
+
+    def restore(self, pages: Dict[int, Cells], size: int) -> None:
+        """
+        Replaces the contents of this memory with shared pages, as returned by share.
+        """
+        self.pages = dict(pages)
+        self.owned = {}
+        self.size = size
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    The state of an IntPuter at a point in time, as taken by IntPuter.snapshot. Pipes are not included.
+    """
+    # Copy of flat memory, or the shared pages of paged memory
+    memory: Union[Cells, Dict[int, Cells]]
+    # Memory size
+    size: int
+    ptr: int
+    rel_base: int
+    ended: bool
+
+
+# Checkpoint file layout. A header, followed by sections of packed little endian int64 values for the program image,
+# the memory extents and the queued pipe data. Values too large for 64 bits are stored as 0 and listed in a table of
+# escapes at the end of the file.
+CHECKPOINT_MAGIC = b'INTCKPT1'
+# Magic, ended, ptr, rel_base, instructions, io_count, memory size
+CHECKPOINT_HEADER = struct.Struct('<8s?qqqqq')
+# Number of values in a section or extents in memory, or a pipe's capacity, -1 standing in for None
+CHECKPOINT_COUNT = struct.Struct('<q')
+# Start address and length of a memory extent
+CHECKPOINT_EXTENT = struct.Struct('<qq')
+# Section, index and byte length of an escaped value
+CHECKPOINT_ESCAPE = struct.Struct('<Bqi')
+# Section numbers used by escapes. Memory escapes are indexed by address, the others by position in the section.
+SECTION_IMAGE, SECTION_MEMORY, SECTION_INPUT, SECTION_OUTPUT = range(4)
+
+
+def pack_values(values: Iterable[int], section: int, escapes: List[Tuple[int, int, int]], offset: int = 0) -> bytes:
+    """
+    Packs values as little endian int64. Any value which doesn't fit is packed as 0 and added to escapes along with its
+    section and its index plus offset.
+    """
+    values = list(values)
+    try:
+        packed = array('q', values)
+    except OverflowError:
+        packed = array('q')
+        for index, val in enumerate(values):
+            if -(1 << 63) <= val < (1 << 63):
+                packed.append(val)
+            else:
+                packed.append(0)
+                escapes.append((section, index + offset, val))
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_values(buffer, offset: int, count: int) -> array:
+    """
+    Unpacks count little endian int64 values starting at offset in buffer.
+    """
+    values = array('q')
+    values.frombytes(buffer[offset:offset + count * 8])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+@dataclass
+class Profile:
+    """
+    Instrumentation collected by an IntPuter with profiling enabled, see IntPuter.enable_profiling. Profiling runs
+    every instruction through the interpreter, compiled blocks are not used while it is enabled.
+    """
+    # Total instructions executed
+    instructions: int = 0
+    # Instructions executed by OpCode name
+    op_codes: Dict[str, int] = field(default_factory=dict)
+    # Instructions executed by address, hot loops show up as the most visited addresses
+    addresses: Dict[int, int] = field(default_factory=dict)
+    # Instructions executed by each completed run, from reset until the program halted
+    runs: List[int] = field(default_factory=list)
+    # Instructions executed by the current run so far
+    current_run: int = 0
+    # Number of times the IntPuter had to wait for input, and the total time spent waiting in seconds
+    input_waits: int = 0
+    input_wait_time: float = 0.0
+    # Largest memory size reached
+    memory_high_water: int = 0
+
+    def record(self, name: str, addr: int) -> None:
+        """
+        Counts an executed instruction.
+        """
+        self.op_codes[name] = self.op_codes.get(name, 0) + 1
+        self.addresses[addr] = self.addresses.get(addr, 0) + 1
+        self.instructions += 1
+        self.current_run += 1
+
+    def to_json(self, indent: int = None) -> str:
+        """
+        Dumps the profile as JSON.
+        """
+        return json.dumps({
+            'instructions': self.instructions,
+            'op_codes': self.op_codes,
+            'addresses': {str(k): v for k, v in sorted(self.addresses.items())},
+            'runs': self.runs,
+            'current_run': self.current_run,
+            'input_waits': self.input_waits,
+            'input_wait_time': self.input_wait_time,
+            'memory_high_water': self.memory_high_water,
+        }, indent=indent)
+
+
+class RunState(Enum):
+    """
+    Reasons an IntPuter stops running synchronously.
+    """
+    # The program has executed a Stop instruction
+    HALTED = 'halted'
+    # The program is blocked on an Input instruction and the input pipe is empty
+    WAITING_INPUT = 'waiting for input'
+    # The program is blocked on an Output instruction and the output pipe is full
+    WAITING_OUTPUT = 'waiting for output space'
+    # The run used up its instruction budget
+    BUDGET_EXHAUSTED = 'instruction budget exhausted'
+    # The loop detector saw the IntPuter return to an earlier state without doing any I/O, so it would never stop
+    LOOPING = 'stuck in a loop'
 
 
 class IntPuter:
@@ -52,24 +490,71 @@ class IntPuter:
     This class is the IntPuter interpreter. It supports a number of different opcodes of various sizes and can be run in
     asynchronous mode with other instances or external peripherals using Pipes for communication.
     """
-    # Initial loaded code, for resets
-    __code: List[int] = []
-    # Current copy of the code
-    code: List[int] = []
+    # Initial loaded program, for resets
+    program: Program = None
+    # Current copy of the code. Compact flat memory is an array of 64 bit integers, until a number too large for that is
+    # stored and it's promoted to a list.
+    code: Union[Cells, PagedMemory] = []
     # Instruction pointer
     ptr: int = 0
     # Relative memory base
     rel_base: int = 0
     # Whether or not the program has ended
     ended: bool = False
+    # Why the last run stopped
+    state: Optional[RunState] = None
+    # Total instructions executed, and I/O instructions executed, since the IntPuter was created
+    instructions: int = 0
+    io_count: int = 0
+    # Whether memory is sparse and paged, or flat
+    paged: bool = False
+    # Whether flat memory starts out as a compact array of 64 bit integers, or a list. Lists take several times the
+    # memory but are faster to read numbers from, as the array has to box every number it returns.
+    compact: bool = True
+    # Whether hot code is compiled into Python functions, see intcompiler
+    compiled: bool = False
+    # Profiling data, None unless profiling is enabled
+    profile: Optional[Profile] = None
     # I/O pipes
     input_pipe: Pipe = None
     output_pipe: Pipe = None
+    # Decoded instruction cache, keyed by the address of the instruction
+    decoded: Dict[int, Decoded] = {}
+    # Compiled block cache, keyed by the address of the first instruction in the block
+    blocks: Dict[int, Block] = {}
+    # Number of times each address has been reached by the interpreter in compiled mode, to find hot code
+    hits: Dict[int, int] = {}
+    # Number of times a compiled block has been invalidated by a write, keyed by the address of the block
+    recompiles: Dict[int, int] = {}
+    # Memory cells covered by cached instructions or blocks, mapped to the addresses of the instructions covering them
+    cached_cells: Dict[int, Set[int]] = {}
 
-    def __init__(self, code: str, input_pipe: Pipe = None, output_pipe: Pipe = None):
-        self.__code = [int(x) for x in code.split(',')]
+    # Number of instructions the last compiled block completed before leaving early, 0 if it ran to the end
+    exited_early: int = 0
+
+    # Number of times the interpreter has to reach an address before a block is compiled there
+    COMPILE_THRESHOLD: int = 8
+    # Number of extra times an address has to be reached before recompiling a block invalidated by a write, doubled for
+    # each time the block has been invalidated before
+    COMPILE_COOLDOWN: int = 64
+    # Number of instructions between state checks when detecting loops
+    LOOP_CHECK_INTERVAL: int = 4096
+
+    def __init__(self, code: Union[str, Program], input_pipe: Pipe = None, output_pipe: Pipe = None,
+                 paged: bool = False, compiled: bool = False, compact: bool = True):
+        self.program = code if isinstance(code, Program) else Program(code)
         self.input_pipe = input_pipe
         self.output_pipe = output_pipe
+        self.paged = paged
+        self.compact = compact
+        self.compiled = compiled
+        self.decoded = {}
+        self.blocks = {}
+        self.hits = {}
+        self.recompiles = {}
+        self.cached_cells = {}
+        if paged:
+            self.code = PagedMemory(self.program.image)
         self.reset()
 
     def op_add(self, o1: Val, o2: Val, r: Val) -> None:
@@ -78,21 +563,26 @@ class IntPuter:
     def op_mul(self, o1: Val, o2: Val, r: Val) -> None:
         self.set_value(r, self.load_val(o1) * self.load_val(o2))
 
-    async def op_input(self, r: Val) -> None:
-        if self.input_pipe:
-            val = await self.input_pipe.dequeue()
+    def op_input(self, r: Val) -> Optional[RunState]:
+        if self.input_pipe is not None:
+            val = self.input_pipe.dequeue_nowait()
+            # Nothing queued, stop here without moving the instruction pointer so the input is retried
+            if val is None:
+                return RunState.WAITING_INPUT
         else:
             val = int(input("Input Required:"))
+        self.io_count += 1
         self.set_value(r, val)
 
-    async def op_output(self, i: Val) -> None:
-        val = self.load_val(i)
+    def op_output(self, i: Val) -> Optional[RunState]:
         if self.output_pipe is not None:
-            self.output_pipe.enqueue(val)
-            # Relinquish control to the event loop allowing other processes to run.
-            await asyncio.sleep(0)
+            # No space, stop here without moving the instruction pointer so the output is retried
+            if self.output_pipe.full():
+                return RunState.WAITING_OUTPUT
+            self.output_pipe.enqueue(self.load_val(i))
         else:
-            print(val)
+            print(self.load_val(i))
+        self.io_count += 1
 
     def op_jump_true(self, i: Val, o: Val) -> bool:
         if self.load_val(i):
@@ -181,28 +671,102 @@ class IntPuter:
         }
     }
 
+    # Instruction sizes for the OpCodes intcompiler can compile into blocks
+    COMPILED_SIZES = {op_code: instr['size'] for op_code, instr in INSTRUCTIONS.items() if op_code in COMPILED_OPCODES}
+
     # END Instruction Lookup Table
 
-    def decode_instruction(self) -> Tuple[partial, int]:
+    def decode_instruction(self) -> Decoded:
+        """
+        Decodes the instruction at the instruction pointer into its handler and bound parameters. Decoded instructions
+        are cached per address, so an instruction inside a loop is only decoded once.
+        """
+        decoded = self.decoded.get(self.ptr)
+        if decoded is None:
+            decoded = self.decode_at(self.ptr)
+        return decoded
+
+    def decode_at(self, addr: int) -> Decoded:
         """
-        Decodes instructions and parameters into a function. Returns a callable partial with all parameters already
-        bound.
+        Decodes the instruction at the given address and stores it in the instruction cache.
         """
-        # Get the current instruction from the memory location at the instruction pointer
-        instruction: int = self.code[self.ptr]
+        # Get the instruction from the memory location at the address
+        try:
+            instruction: int = self.code[addr]
+        except IndexError:
+            raise IndexError("Instruction pointer {} past end of memory ({})".format(addr, len(self.code))) from None
         # The OpCode is the last 2 digits of the instruction
         op_code: int = instruction % 100
         # Lookup the OpCode in the instruction table
         instr: Dict = self.INSTRUCTIONS[op_code]
+        # Keep a copy of the raw cells so the cache can be checked against memory after a reset
+        raw: Tuple[int, ...] = tuple(self.code[addr:addr + instr['size']])
         # Map the parameter modes. There is probably a more efficient way of doing this but this works so I'll leave it
         modes: List[int] = [
             (instruction // (10 ** (x + 2))) % 10
             for x in range(instr['size'] - 1)
         ]
         # Map the parameters. This zips the parameter modes with the OpCode arguments.
-        params: List[Val] = list(zip(modes, self.code[self.ptr + 1:self.ptr + instr['size']]))
-        # Return a partial with the parameters bound.
-        return partial(instr['function'], self, *params), instr['size']
+        params: Tuple[Val, ...] = tuple(zip(modes, raw[1:]))
+        decoded: Decoded = (instr['function'], params, instr['size'], raw)
+
+        self.decoded[addr] = decoded
+        self.cache_cells(addr, raw)
+        return decoded
+
+    def compile_at(self, addr: int) -> Block:
+        """
+        Compiles the block starting at the given address and stores it in the block cache.
+        """
+        block = compile_block(self.code, addr, self.COMPILED_SIZES)
+        self.blocks[addr] = block
+        self.cache_cells(addr, block[-1])
+        return block
+
+    def cache_cells(self, start: int, raw: Tuple[int, ...]) -> None:
+        """
+        Records the memory cells covered by a cached instruction or block, so writes to them invalidate it.
+        """
+        for cell in range(start, start + len(raw)):
+            self.cached_cells.setdefault(cell, set()).add(start)
+
+    def invalidate(self, addr: int) -> None:
+        """
+        Drops any cached instructions or blocks covering a memory cell. Called whenever a write lands inside cached
+        code, so self-modifying code is decoded again the next time it runs.
+        """
+        for start in self.cached_cells.pop(addr, ()):
+            for cache in (self.decoded, self.blocks):
+                entry = cache.pop(start, None)
+                if entry is None:
+                    continue
+                if cache is self.blocks:
+                    # Code that keeps rewriting itself would otherwise be recompiled every time it's reached, so wait
+                    # longer before recompiling each time it happens
+                    count = self.recompiles.get(start, 0)
+                    self.recompiles[start] = count + 1
+                    self.hits[start] = -(self.COMPILE_COOLDOWN << min(count, 16))
+                for cell in range(start, start + len(entry[-1])):
+                    starts = self.cached_cells.get(cell)
+                    if starts is not None:
+                        starts.discard(start)
+                        if not starts:
+                            del self.cached_cells[cell]
+
+    def revalidate_cache(self, pages: Set[int] = None) -> None:
+        """
+        Drops cached instructions and blocks which no longer match memory. Used when memory is replaced wholesale, e.g.
+        on reset, where code decoded from self-modified memory must go but everything else can be kept. With paged
+        memory, only code on the given pages is checked.
+        """
+        for cache in (self.decoded, self.blocks):
+            for start, entry in list(cache.items()):
+                raw = entry[-1]
+                if pages is not None and start >> PagedMemory.PAGE_BITS not in pages \
+                        and (start + len(raw) - 1) >> PagedMemory.PAGE_BITS not in pages:
+                    continue
+                if tuple(self.code[start:start + len(raw)]) != raw:
+                    self.invalidate(start)
 
     def load_val(self, val_spec: Val) -> int:
         """
@@ -224,7 +788,13 @@ class IntPuter:
             raise Exception("Can't store in immediate mode")
         else:
             addr = self.decode_address(val_spec)
-            self.code[addr] = value
+            try:
+                self.code[addr] = value
+            except OverflowError:
+                self.promote()
+                self.code[addr] = value
+            if addr in self.cached_cells:
+                self.invalidate(addr)
 
     def decode_address(self, val_spec: Val) -> int:
         """
@@ -243,54 +813,562 @@ class IntPuter:
     def check_bounds(self, addr: int) -> None:
         """
         Check if the code is trying to access memory outside of the bounds of the array, increase the size as requried.
+        Paged memory doesn't need growing, it only records the new size.
         """
         if addr >= len(self.code):
-            extra = addr - len(self.code) + 1
-            self.code.extend([0] * extra)
+            if self.paged:
+                self.code.size = addr + 1
+            else:
+                extra = addr - len(self.code) + 1
+                self.code.extend([0] * extra)
+            if self.profile is not None:
+                self.profile.memory_high_water = max(self.profile.memory_high_water, addr + 1)
 
     def reset(self) -> None:
         """
-        Resets the IntPuter to it's initial state.
+        Resets the IntPuter to it's initial state. Compact flat memory is reloaded with a single buffer copy, and paged
+        memory only has to drop the pages written since the last reset.
         """
-        self.code = self.__code[::]
         self.ptr = 0
         self.ended = False
+        self.state = None
         self.rel_base = 0
+        if self.profile is not None:
+            self.profile.current_run = 0
+        if self.paged:
+            self.revalidate_cache(self.code.reset())
+        else:
+            self.code = self.program.load() if self.compact else list(self.program.image)
+            self.revalidate_cache()
+
+    def snapshot(self) -> Snapshot:
+        """
+        Captures the current state of the IntPuter so it can be returned to later with restore. Paged memory is shared
+        with the snapshot and only copied a page at a time as the IntPuter writes to it, flat memory is copied.
+        """
+        if self.paged:
+            memory = self.code.share()
+        else:
+            memory = self.code[::]
+        return Snapshot(memory, len(self.code), self.ptr, self.rel_base, self.ended)
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """
+        Returns the IntPuter to a state captured with snapshot. The snapshot is left untouched and can be restored again.
+        """
+        if self.paged:
+            self.code.restore(snapshot.memory, snapshot.size)
+        else:
+            self.code = snapshot.memory[::]
+        self.ptr = snapshot.ptr
+        self.rel_base = snapshot.rel_base
+        self.ended = snapshot.ended
+        self.revalidate_cache()
+
+    def fork(self) -> 'IntPuter':
+        """
+        Returns an independent copy of the IntPuter in its current state, with copies of its pipes. Paged memory is
+        shared between both until either writes to it, flat memory is copied. The decoded instruction cache is copied
+        too, so the fork starts warm.
+        """
+        machine = copy.copy(self)
+        if self.paged:
+            machine.code = self.code.fork()
+        else:
+            machine.code = self.code[::]
+        machine.decoded = dict(self.decoded)
+        machine.blocks = dict(self.blocks)
+        machine.hits = dict(self.hits)
+        machine.recompiles = dict(self.recompiles)
+        machine.cached_cells = {cell: set(starts) for cell, starts in self.cached_cells.items()}
+        if self.input_pipe is not None:
+            machine.input_pipe = self.input_pipe.fork()
+        if self.output_pipe is not None:
+            machine.output_pipe = self.output_pipe.fork()
+        if self.profile is not None:
+            machine.enable_profiling()
+        return machine
+
+    def save_checkpoint(self, path: str) -> None:
+        """
+        Saves the complete state of the IntPuter to a compact binary file, including the program it was loaded with and
+        any data queued in its pipes, so it can be picked up again later or by another process with load_checkpoint.
+        Paged memory only saves the pages that have been written.
+        """
+        escapes: List[Tuple[int, int, int]] = []
+        if self.paged:
+            extents = [
+                (n << PagedMemory.PAGE_BITS, page[:self.code.size - (n << PagedMemory.PAGE_BITS)])
+                for n, page in sorted(self.code.pages.items())
+            ]
+        else:
+            extents = [(0, self.code)]
+
+        parts = [
+            CHECKPOINT_HEADER.pack(
+                CHECKPOINT_MAGIC, self.ended, self.ptr, self.rel_base, self.instructions, self.io_count, len(self.code)
+            ),
+            CHECKPOINT_COUNT.pack(len(self.program)),
+            pack_values(self.program.image, SECTION_IMAGE, escapes),
+            CHECKPOINT_COUNT.pack(len(extents)),
+        ]
+        for start, values in extents:
+            parts.append(CHECKPOINT_EXTENT.pack(start, len(values)))
+            parts.append(pack_values(values, SECTION_MEMORY, escapes, start))
+        for section, pipe in ((SECTION_INPUT, self.input_pipe), (SECTION_OUTPUT, self.output_pipe)):
+            if pipe is None:
+                parts.append(CHECKPOINT_COUNT.pack(-1))
+                continue
+            parts.append(CHECKPOINT_COUNT.pack(len(pipe.data)))
+            parts.append(CHECKPOINT_COUNT.pack(pipe.capacity if pipe.capacity is not None else -1))
+            parts.append(pack_values(pipe.data, section, escapes))
+        parts.append(CHECKPOINT_COUNT.pack(len(escapes)))
+        for section, index, val in escapes:
+            raw = val.to_bytes(val.bit_length() // 8 + 1, 'little', signed=True)
+            parts.append(CHECKPOINT_ESCAPE.pack(section, index, len(raw)))
+            parts.append(raw)
+
+        with open(path, 'wb') as f:
+            f.write(b''.join(parts))
+
+    @classmethod
+    def load_checkpoint(cls, path: str, paged: bool = False, compiled: bool = False) -> 'IntPuter':
+        """
+        Loads an IntPuter saved with save_checkpoint, ready to carry on from where it was saved. The file is memory
+        mapped and its values copied straight into place, nothing is parsed. Pipes are recreated with their queued data
+        if the saved IntPuter had them. Either memory model can load a checkpoint saved by the other.
+        """
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            magic, ended, ptr, rel_base, instructions, io_count, size = CHECKPOINT_HEADER.unpack_from(buffer, 0)
+            if magic != CHECKPOINT_MAGIC:
+                raise ValueError("{} is not an IntPuter checkpoint".format(path))
+            offset = CHECKPOINT_HEADER.size
+
+            (count,) = CHECKPOINT_COUNT.unpack_from(buffer, offset)
+            image = unpack_values(buffer, offset + CHECKPOINT_COUNT.size, count)
+            offset += CHECKPOINT_COUNT.size + count * 8
+
+            (count,) = CHECKPOINT_COUNT.unpack_from(buffer, offset)
+            offset += CHECKPOINT_COUNT.size
+            extents = []
+            for _ in range(count):
+                start, length = CHECKPOINT_EXTENT.unpack_from(buffer, offset)
+                offset += CHECKPOINT_EXTENT.size
+                extents.append((start, unpack_values(buffer, offset, length)))
+                offset += length * 8
+
+            pipes = []
+            for _ in range(2):
+                (count,) = CHECKPOINT_COUNT.unpack_from(buffer, offset)
+                offset += CHECKPOINT_COUNT.size
+                if count < 0:
+                    pipes.append(None)
+                    continue
+                (capacity,) = CHECKPOINT_COUNT.unpack_from(buffer, offset)
+                offset += CHECKPOINT_COUNT.size
+                pipes.append((unpack_values(buffer, offset, count).tolist(), capacity if capacity >= 0 else None))
+                offset += count * 8
+
+            (count,) = CHECKPOINT_COUNT.unpack_from(buffer, offset)
+            offset += CHECKPOINT_COUNT.size
+            escapes = []
+            for _ in range(count):
+                section, index, length = CHECKPOINT_ESCAPE.unpack_from(buffer, offset)
+                offset += CHECKPOINT_ESCAPE.size
+                escapes.append((section, index, int.from_bytes(buffer[offset:offset + length], 'little', signed=True)))
+                offset += length
+
+        image_escapes = [(index, val) for section, index, val in escapes if section == SECTION_IMAGE]
+        if image_escapes:
+            image = image.tolist()
+            for index, val in image_escapes:
+                image[index] = val
+        for section, pipe in ((SECTION_INPUT, pipes[0]), (SECTION_OUTPUT, pipes[1])):
+            for escape_section, index, val in escapes:
+                if escape_section == section:
+                    pipe[0][index] = val
+        input_pipe, output_pipe = [
+            Pipe(deque(pipe[0]), capacity=pipe[1]) if pipe is not None else None for pipe in pipes
+        ]
+
+        machine = cls(Program.from_values(image), input_pipe, output_pipe, paged=paged, compiled=compiled)
+        memory = machine.code
+        if paged:
+            # Extents always start on a page boundary, as they're either whole pages or all of a flat memory
+            pages = {}
+            for start, values in extents:
+                for page_start in range(start, start + len(values), PagedMemory.PAGE_SIZE):
+                    page = memory.load_page(page_start >> PagedMemory.PAGE_BITS)
+                    chunk = values[page_start - start:page_start - start + PagedMemory.PAGE_SIZE]
+                    page[:len(chunk)] = chunk
+                    pages[page_start >> PagedMemory.PAGE_BITS] = page
+            memory.restore(pages, size)
+        else:
+            if size > len(memory):
+                memory.extend([0] * (size - len(memory)))
+            for start, values in extents:
+                memory[start:start + len(values)] = values
+        for section, index, val in escapes:
+            if section == SECTION_MEMORY:
+                machine.set_loc(index, val)
+
+        machine.ptr = ptr
+        machine.rel_base = rel_base
+        machine.ended = ended
+        machine.instructions = instructions
+        machine.io_count = io_count
+        machine.revalidate_cache()
+        return machine
+
+    def enable_profiling(self) -> Profile:
+        """
+        Starts collecting a Profile of everything the IntPuter runs from now on. Returns the profile, which is also
+        available as the profile attribute.
+        """
+        self.profile = Profile(memory_high_water=len(self.code))
+        return self.profile
+
+    def disable_profiling(self) -> None:
+        """
+        Stops collecting profiling data.
+        """
+        self.profile = None
+
+    def promote(self) -> None:
+        """
+        Switches flat memory from an array of 64 bit integers to a list, which can hold numbers of any size. Called the
+        first time a value too large for the array is stored.
+        """
+        self.code = self.code.tolist()
 
     def set_loc(self, loc: int, val: int) -> None:
         """
         Sets the value of a specific memory location.
         """
-        self.code[loc] = val
+        try:
+            self.code[loc] = val
+        except OverflowError:
+            self.promote()
+            self.code[loc] = val
+        if loc in self.cached_cells:
+            self.invalidate(loc)
 
-    async def run_async(self):
+    def run_until_blocked(self, max_instructions: int = None, detect_loops: bool = False) -> RunState:
         """
-        Run the IntPuter code asynchronously
+        Run the IntPuter code synchronously until it halts or needs input that isn't available yet. Returns the reason
+        it stopped, running it again after queueing more input carries on from where it left off.
+
+        Arguments:
+        max_instructions -- stop with BUDGET_EXHAUSTED after executing this many instructions.
+        detect_loops -- check the IntPuter's state every LOOP_CHECK_INTERVAL instructions, stopping with LOOPING if it
+            repeats an earlier state without doing any I/O in between.
         """
-        while not self.ended:
-            # lookup and call instruction
-            try:
-                instruction, size = self.decode_instruction()
-            except IndexError:
-                print("Instruction Pointer:", self.ptr, len(self.code))
+        if detect_loops:
+            self.state = self.run_detecting_loops(max_instructions)
+        else:
+            limit = max_instructions if max_instructions is not None else sys.maxsize
+            if self.profile is not None:
+                self.state = self.run_profiled(limit)
+            elif self.compiled:
+                self.state = self.run_compiled(limit)
             else:
+                self.state = self.run_interpreted(limit)
+        return self.state
+
+    def run_interpreted(self, limit: int) -> RunState:
+        """
+        The interpreter loop behind run_until_blocked, running at most limit instructions.
+        """
+        decoded = self.decoded
+        executed = 0
+        try:
+            while not self.ended:
+                if executed == limit:
+                    return RunState.BUDGET_EXHAUSTED
+                # lookup and call instruction
+                instruction = decoded.get(self.ptr)
+                if instruction is None:
+                    instruction = self.decode_at(self.ptr)
+                function, params, size, _ = instruction
                 # Run the instruction
-                result = instruction()
-                # Some operations are async, but not all. If it is, await the result.
-                if inspect.isawaitable(result):
-                    result = await result
+                result = function(self, *params)
+
+                # Jumps return True if the jump occurred, False otherwise. Blocked instructions return the RunState to
+                # stop with. Everything else returns None. The below executes on any instruction which didn't jump or
+                # block, updating the instruction pointer.
+                if not result:
+                    self.ptr += size
+                elif result is not True:
+                    return result
+                executed += 1
+        finally:
+            self.instructions += executed
 
-                # Jumps return True if the jump occurred, False otherwise. Everything else returns None.
-                # The below executes on any instruction which didn't jump, updating the instruction pointer.
+        return RunState.HALTED
+
+    def run_compiled(self, limit: int) -> RunState:
+        """
+        Compiled version of run_interpreted. Addresses the interpreter reaches often enough get compiled into blocks,
+        which then run in place of the interpreter. Anything a block can't handle, code which has been overwritten since
+        it was compiled, or a block which would overrun the instruction budget, is interpreted as normal.
+        """
+        decoded = self.decoded
+        blocks = self.blocks
+        hits = self.hits
+        threshold = self.COMPILE_THRESHOLD
+        executed = 0
+        try:
+            while not self.ended:
+                if executed >= limit:
+                    return RunState.BUDGET_EXHAUSTED
+                ptr = self.ptr
+                block = blocks.get(ptr)
+                if block is None:
+                    count = hits.get(ptr, 0) + 1
+                    hits[ptr] = count
+                    if count >= threshold:
+                        block = self.compile_at(ptr)
+                if block is not None and block[0] is not None and executed + block[1] <= limit:
+                    self.ptr = block[0](self)
+                    if self.exited_early:
+                        executed += self.exited_early
+                        self.exited_early = 0
+                    else:
+                        executed += block[1]
+                    continue
+
+                # Not compiled, interpret a single instruction
+                instruction = decoded.get(ptr)
+                if instruction is None:
+                    instruction = self.decode_at(ptr)
+                function, params, size, _ = instruction
+                result = function(self, *params)
+                if not result:
+                    self.ptr += size
+                elif result is not True:
+                    return result
+                executed += 1
+        finally:
+            self.instructions += executed
+
+        return RunState.HALTED
+
+    def run_profiled(self, limit: int) -> RunState:
+        """
+        Instrumented version of run_interpreted, used while profiling is enabled.
+        """
+        profile = self.profile
+        decoded = self.decoded
+        executed = 0
+        try:
+            while not self.ended:
+                if executed == limit:
+                    return RunState.BUDGET_EXHAUSTED
+                ptr = self.ptr
+                instruction = decoded.get(ptr)
+                if instruction is None:
+                    instruction = self.decode_at(ptr)
+                function, params, size, raw = instruction
+                result = function(self, *params)
                 if not result:
                     self.ptr += size
+                elif result is not True:
+                    return result
+                executed += 1
+
+                # Only count instructions which completed, a blocked input is counted once it gets its value
+                profile.record(self.INSTRUCTIONS[raw[0] % 100]['name'], ptr)
+        finally:
+            self.instructions += executed
+
+        profile.runs.append(profile.current_run)
+        profile.current_run = 0
+        return RunState.HALTED
+
+    def run_detecting_loops(self, max_instructions: int = None) -> RunState:
+        """
+        Runs in chunks of LOOP_CHECK_INTERVAL instructions, taking a signature of the instruction pointer, relative base
+        and memory after each one. The IntPuter is deterministic, so seeing the same signature twice with no I/O in
+        between means it will go round the same loop forever. Loops which never repeat a state, like counting forever,
+        are only stopped by the instruction budget.
+        """
+        seen: Set[Tuple[int, int, int]] = set()
+        remaining = max_instructions
+        io_count = self.io_count
+        while True:
+            chunk = self.LOOP_CHECK_INTERVAL if remaining is None else min(self.LOOP_CHECK_INTERVAL, remaining)
+            start = self.instructions
+            state = self.run_until_blocked(chunk)
+            if remaining is not None:
+                remaining -= self.instructions - start
+            if state is not RunState.BUDGET_EXHAUSTED or remaining == 0:
+                return state
+
+            # Any I/O means earlier states can't be compared with this one
+            if self.io_count != io_count:
+                io_count = self.io_count
+                seen.clear()
+            signature = (self.ptr, self.rel_base, self.memory_hash())
+            if signature in seen:
+                return RunState.LOOPING
+            seen.add(signature)
+
+    def memory_hash(self) -> int:
+        """
+        Hashes the current contents of memory.
+        """
+        if self.paged:
+            return hash((self.code.size, tuple((n, tuple(page)) for n, page in sorted(self.code.pages.items()))))
+        return hash(tuple(self.code))
+
+    def provide_input(self, val: int) -> None:
+        """
+        Completes an Input instruction the IntPuter is blocked on with the given value.
+        """
+        _, params, size, raw = self.decode_instruction()
+        self.set_value(params[0], val)
+        self.instructions += 1
+        self.io_count += 1
+        if self.profile is not None:
+            self.profile.record(self.INSTRUCTIONS[raw[0] % 100]['name'], self.ptr)
+        self.ptr += size
+
+    def resume(self, inputs: Iterable[int] = ()) -> List[int]:
+        """
+        Queues the given inputs and runs until the IntPuter needs more input than it has, or halts. Returns the outputs
+        produced along the way. This lets peripherals drive an IntPuter from a plain loop with no event loop involved,
+        the state attribute says whether it stopped for input or halted. Pipes are created if the IntPuter has none.
+        """
+        if self.input_pipe is None:
+            self.input_pipe = Pipe()
+        if self.output_pipe is None:
+            self.output_pipe = Pipe()
+        self.input_pipe.enqueue_many(inputs)
+        outputs = []
+        # A bounded output pipe is drained as it fills up
+        while self.run_until_blocked() is RunState.WAITING_OUTPUT:
+            outputs.extend(self.output_pipe.drain())
+        outputs.extend(self.output_pipe.drain())
+        return outputs
+
+    async def run_async(self, max_instructions: int = None, detect_loops: bool = False):
+        """
+        Run the IntPuter code asynchronously. Runs synchronously until the input pipe runs dry, and only then waits on
+        the pipe. The arguments are as for run_until_blocked and apply to the whole run, the reason it stopped is left in
+        the state attribute.
+        """
+        stop_at = self.instructions + max_instructions if max_instructions is not None else None
+        while True:
+            budget = stop_at - self.instructions if stop_at is not None else None
+            state = self.run_until_blocked(budget, detect_loops)
+            if state is RunState.WAITING_OUTPUT:
+                await self.output_pipe.wait_for_space()
+                continue
+            if state is not RunState.WAITING_INPUT:
+                break
+            # Relinquish control to the event loop allowing other processes to consume our output before we wait.
+            await asyncio.sleep(0)
+            if self.profile is not None:
+                start = time.perf_counter()
+                val = await self.input_pipe.dequeue()
+                self.profile.input_waits += 1
+                self.profile.input_wait_time += time.perf_counter() - start
+            else:
+                val = await self.input_pipe.dequeue()
+            self.provide_input(val)
+
+        if self.output_pipe is not None:
+            await asyncio.sleep(0)
 
         return self.code
 
-    def run(self):
+    def run(self, max_instructions: int = None, detect_loops: bool = False):
         """
-        Sets up and runs synchronously by creating an internal event loop and calling run_async.
+        Runs synchronously. An internal event loop is only created if the program blocks on an empty input pipe or a
+        full output pipe, in which case it calls run_async to wait. The arguments are as for run_until_blocked, the
+        reason the run stopped is left in the state attribute.
         """
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        return loop.run_until_complete(self.run_async())
+        start = self.instructions
+        if self.run_until_blocked(max_instructions, detect_loops) in (RunState.WAITING_INPUT, RunState.WAITING_OUTPUT):
+            if max_instructions is not None:
+                max_instructions -= self.instructions - start
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.run_async(max_instructions, detect_loops))
+        return self.code
+
+
+class Network:
+    """
+    A group of IntPuters connected by Pipes, run together on a single thread without an event loop. Each machine runs
+    until it blocks, then the next one that can make progress takes over, so a machine only ever stops when it has run
+    out of input or filled its output pipe. This keeps feedback loops and larger clusters running at interpreter speed
+    rather than stopping for an event loop round trip on every value passed between machines.
+    """
+
+    def __init__(self, machines: Iterable[IntPuter] = ()):
+        self.machines: List[IntPuter] = list(machines)
+
+    def add(self, machine: IntPuter) -> IntPuter:
+        if machine not in self.machines:
+            self.machines.append(machine)
+        return machine
+
+    def connect(self, source: IntPuter, destination: IntPuter, capacity: int = None) -> Pipe:
+        """
+        Connects the output of source to the input of destination with a new pipe, adding either machine to the network
+        if it isn't already part of it.
+        """
+        pipe = Pipe(capacity=capacity)
+        self.add(source).output_pipe = pipe
+        self.add(destination).input_pipe = pipe
+        return pipe
+
+    @staticmethod
+    def ready(machine: IntPuter) -> bool:
+        """
+        Whether the machine can make progress if it's run.
+        """
+        if machine.ended:
+            return False
+        if machine.state is RunState.WAITING_INPUT:
+            return bool(machine.input_pipe.data)
+        if machine.state is RunState.WAITING_OUTPUT:
+            return not machine.output_pipe.full()
+        return True
+
+    def blocked(self) -> List[IntPuter]:
+        """
+        The machines which haven't halted.
+        """
+        return [machine for machine in self.machines if not machine.ended]
+
+    def run(self, max_instructions: int = None) -> RunState:
+        """
+        Runs the machines in turn until every one has halted, or none of them can make progress. Returns HALTED if they
+        all halted. Otherwise the network is deadlocked, or waiting on pipes fed from outside of it, and it returns
+        WAITING_INPUT if any machine is waiting for input or WAITING_OUTPUT if they're all waiting for space. Queueing
+        more data and calling run again carries on from there. max_instructions limits the instructions run across
+        every machine, stopping with BUDGET_EXHAUSTED.
+        """
+        remaining = max_instructions
+        progressed = True
+        while progressed:
+            progressed = False
+            for machine in self.machines:
+                if not self.ready(machine):
+                    continue
+                if remaining == 0:
+                    return RunState.BUDGET_EXHAUSTED
+                start = machine.instructions
+                machine.run_until_blocked(remaining)
+                if remaining is not None:
+                    remaining -= machine.instructions - start
+                progressed = True
+
+        blocked = self.blocked()
+        if not blocked:
+            return RunState.HALTED
+        if any(machine.state is RunState.WAITING_INPUT for machine in blocked):
+            return RunState.WAITING_INPUT
+        return RunState.WAITING_OUTPUT
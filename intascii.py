@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+from typing import Iterable, List
+
+from inputer import IntPuter, Pipe
+
+
+class AsciiAdapter:
+    """
+    Talks to an IntPuter running an ASCII program, one that reads and prints text a character code at a time. Strings
+    are encoded into the input pipe and outputs are decoded back into text in bulk, rather than a character at a time.
+
+    Outputs outside of the ASCII range, like a final answer printed after the text, can't be part of the text. They're
+    collected in values instead, in the order they were printed.
+    """
+
+    def __init__(self, computer: IntPuter):
+        self.computer: IntPuter = computer
+        if computer.input_pipe is None:
+            computer.input_pipe = Pipe()
+        if computer.output_pipe is None:
+            computer.output_pipe = Pipe()
+        # Non-ASCII outputs
+        self.values: List[int] = []
+
+    def send(self, text: str) -> None:
+        """
+        Queues text as input without running anything.
+        """
+        self.computer.input_pipe.enqueue_many(text.encode('ascii'))
+
+    def send_lines(self, lines: Iterable[str]) -> None:
+        """
+        Queues each line as input, adding the newlines.
+        """
+        self.send(''.join(line + '\n' for line in lines))
+
+    def decode(self, outputs: List[int]) -> str:
+        """
+        Turns outputs into text, moving any non-ASCII values into values.
+        """
+        try:
+            raw = bytes(outputs)
+        except ValueError:
+            # Something was outside of 0-255, so there's definitely a value to pick out
+            raw = None
+        if raw is None or not raw.isascii():
+            self.values.extend(x for x in outputs if not 0 <= x < 128)
+            raw = bytes(x for x in outputs if 0 <= x < 128)
+        return raw.decode('ascii')
+
+    def run(self, text: str = '') -> str:
+        """
+        Sends text, then runs the IntPuter until it needs more input than it has or halts, returning the text it printed
+        along the way.
+        """
+        self.send(text)
+        return self.decode(self.computer.resume())
+
+    def lines(self, text: str = '') -> List[str]:
+        """
+        Runs like run, returning the printed text split into lines, without the line endings.
+        """
+        return self.run(text).splitlines()
+
+    def read(self) -> str:
+        """
+        Decodes anything waiting in the output pipe, for when the IntPuter has been run some other way.
+        """
+        return self.decode(self.computer.output_pipe.drain())
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+from collections import deque
+from enum import IntEnum
+from typing import Deque, Iterable, List, Sequence, Union
+
+import numpy as np
+
+from inputer import IntPuter, Program
+
+# Instruction sizes by OpCode
+SIZES = {op_code: instr['size'] for op_code, instr in IntPuter.INSTRUCTIONS.items()}
+
+# Smallest magnitude, in floating point, at which a product might not fit in a 64 bit integer. Floating point products
+# are only close to the real ones, so this is well below 2 ** 63 and the few products past it are checked exactly.
+PRODUCT_LIMIT = float(2 ** 62)
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+# Bytes of memory the whole batch may grow to by default. Every instance's memory is as wide as the widest, so one
+# instance reaching a high address would otherwise grow them all.
+MEMORY_BUDGET = 1 << 28
+
+
+class BatchState(IntEnum):
+    """
+    State of each instance in a BatchPuter.
+    """
+    RUNNING = 0
+    # Executed a Stop instruction
+    HALTED = 1
+    # Blocked on an Input instruction with no input queued
+    WAITING_INPUT = 2
+    # Hit an unknown OpCode or parameter mode, a negative address or one past the memory limit, or ran off the end of
+    # memory
+    ERROR = 3
+    # Produced a value too large for 64 bits. Rerun the instance on an IntPuter, which has no such limit.
+    OVERFLOW = 4
+
+
+class BatchPuter:
+    """
+    Runs many instances of one program in lockstep, with their memories held as the rows of a 2-D NumPy array.
+
+    Each step groups the running instances by instruction pointer and instruction, and executes each group as a single
+    vectorized operation. While the instances agree on control flow this is one array operation per instruction for the
+    whole batch. When they diverge the batch is split into groups which carry on independently, and merge back together
+    if they reach the same instruction again.
+
+    Instances which would raise an exception on an IntPuter are stopped with the ERROR state instead, so parameter
+    sweeps can simply ignore them. So are instances addressing memory past max_memory cells, which would otherwise grow
+    the memory of the whole batch. Rerun those on an IntPuter if they matter. By default max_memory keeps the batch
+    within MEMORY_BUDGET bytes.
+    """
+
+    def __init__(self, program: Program, count: int, inputs: Sequence[Iterable[int]] = None, max_memory: int = None):
+        self.memory: np.ndarray = np.tile(np.asarray(program.image, dtype=np.int64), (count, 1))
+        self.ptr: np.ndarray = np.zeros(count, dtype=np.int64)
+        self.rel_base: np.ndarray = np.zeros(count, dtype=np.int64)
+        self.state: np.ndarray = np.full(count, BatchState.RUNNING, dtype=np.int8)
+        self.inputs: List[Deque[int]] = [deque(x) for x in inputs] if inputs is not None else [
+            deque() for _ in range(count)
+        ]
+        self.outputs: List[List[int]] = [[] for _ in range(count)]
+        # Number of lockstep steps taken
+        self.steps: int = 0
+        # Most memory cells any instance may use
+        self.max_memory: int = max_memory if max_memory is not None else max(
+            len(program), MEMORY_BUDGET // (8 * max(count, 1))
+        )
+
+    def __len__(self) -> int:
+        return len(self.ptr)
+
+    def set_loc(self, loc: int, values: Union[int, Sequence[int], np.ndarray]) -> None:
+        """
+        Sets a memory location in every instance, either to the same value or one value per instance.
+        """
+        if loc >= self.max_memory:
+            raise IndexError("Address {} is past the memory limit of {} cells".format(loc, self.max_memory))
+        if loc >= self.memory.shape[1]:
+            self.grow(loc + 1)
+        self.memory[:, loc] = values
+
+    def enqueue(self, index: int, val: int) -> None:
+        """
+        Queues an input value for a single instance, letting it continue if it was waiting for input.
+        """
+        self.inputs[index].append(val)
+        if self.state[index] == BatchState.WAITING_INPUT:
+            self.state[index] = BatchState.RUNNING
+
+    def grow(self, size: int) -> None:
+        """
+        Grows every instance's memory to at least size cells. New cells are 0.
+        """
+        columns = self.memory.shape[1]
+        if size > columns:
+            extra = min(max(size, columns * 2), self.max_memory) - columns
+            self.memory = np.pad(self.memory, ((0, 0), (0, extra)))
+
+    def run(self, max_steps: int = None) -> np.ndarray:
+        """
+        Runs until every instance has stopped, or for at most max_steps steps. Returns the state of each instance.
+        """
+        steps = 0
+        while self.step():
+            steps += 1
+            if max_steps is not None and steps >= max_steps:
+                break
+        return self.state
+
+    def step(self) -> bool:
+        """
+        Executes one instruction in every running instance. Returns False if there were no running instances.
+        """
+        running = np.flatnonzero(self.state == BatchState.RUNNING)
+        if not running.size:
+            return False
+        self.steps += 1
+
+        # Group instances by instruction pointer
+        ptrs = self.ptr[running]
+        order = np.argsort(ptrs, kind='stable')
+        running, ptrs = running[order], ptrs[order]
+        splits = np.flatnonzero(np.diff(ptrs)) + 1
+        for rows in np.split(running, splits):
+            ptr = int(self.ptr[rows[0]])
+            if not 0 <= ptr < self.memory.shape[1]:
+                self.state[rows] = BatchState.ERROR
+                continue
+            # Split further by instruction, which only differs if some instances have modified their code
+            words = self.memory[rows, ptr]
+            if (words == words[0]).all():
+                self.execute(rows, ptr, int(words[0]))
+            else:
+                for word in np.unique(words):
+                    self.execute(rows[words == word], ptr, int(word))
+        return True
+
+    def execute(self, rows: np.ndarray, ptr: int, instruction: int) -> None:
+        """
+        Executes the instruction at ptr for a group of instances which share it.
+        """
+        op_code = instruction % 100
+        size = SIZES.get(op_code)
+        if size is None or ptr + size > self.memory.shape[1]:
+            self.state[rows] = BatchState.ERROR
+            return
+        if op_code == 99:
+            self.state[rows] = BatchState.HALTED
+            return
+
+        modes = [(instruction // (10 ** (x + 2))) % 10 for x in range(size - 1)]
+        writes = op_code in (1, 2, 7, 8, 3)
+        if any(mode not in (0, 1, 2) for mode in modes) or (writes and modes[-1] == 1):
+            self.state[rows] = BatchState.ERROR
+            return
+
+        # Resolve every non-immediate parameter to an address, dropping instances with addresses out of range
+        params = self.memory[rows, ptr + 1:ptr + size].T
+        addrs = [
+            params[x] + self.rel_base[rows] if mode == 2 else params[x] if mode == 0 else None
+            for x, mode in enumerate(modes)
+        ]
+        bad = np.zeros(len(rows), dtype=bool)
+        for addr in addrs:
+            if addr is not None:
+                bad |= (addr < 0) | (addr >= self.max_memory)
+        if bad.any():
+            self.state[rows[bad]] = BatchState.ERROR
+            keep = ~bad
+            rows, params = rows[keep], params[:, keep]
+            addrs = [addr[keep] if addr is not None else None for addr in addrs]
+            if not rows.size:
+                return
+        highest = max((int(addr.max()) for addr in addrs if addr is not None), default=-1)
+        if highest >= self.memory.shape[1]:
+            self.grow(highest + 1)
+
+        def load(x: int) -> np.ndarray:
+            return params[x] if addrs[x] is None else self.memory[rows, addrs[x]]
+
+        if op_code in (1, 2, 7, 8):
+            a, b = load(0), load(1)
+            if op_code == 1:
+                result = a + b
+                # Signed overflow: the result's sign differs from both operands'
+                overflow = ((a ^ result) & (b ^ result)) < 0
+            elif op_code == 2:
+                result = a * b
+                overflow = np.abs(a.astype(np.float64) * b) >= PRODUCT_LIMIT
+                for x in np.flatnonzero(overflow):
+                    overflow[x] = not INT64_MIN <= int(a[x]) * int(b[x]) <= INT64_MAX
+            else:
+                result = ((a < b) if op_code == 7 else (a == b)).astype(np.int64)
+                overflow = None
+            dest = addrs[2]
+            if overflow is not None and overflow.any():
+                self.state[rows[overflow]] = BatchState.OVERFLOW
+                ok = ~overflow
+                rows, result, dest = rows[ok], result[ok], dest[ok]
+            self.memory[rows, dest] = result
+            self.ptr[rows] += size
+        elif op_code == 3:
+            dest = addrs[0]
+            for row, addr in zip(rows, dest):
+                if self.inputs[row]:
+                    self.memory[row, addr] = self.inputs[row].popleft()
+                    self.ptr[row] += size
+                else:
+                    self.state[row] = BatchState.WAITING_INPUT
+        elif op_code == 4:
+            for row, val in zip(rows, load(0)):
+                self.outputs[row].append(int(val))
+            self.ptr[rows] += size
+        elif op_code in (5, 6):
+            test = load(0) != 0
+            if op_code == 6:
+                test = ~test
+            self.ptr[rows] = np.where(test, load(1), self.ptr[rows] + size)
+        else:
+            self.rel_base[rows] += load(0)
+            self.ptr[rows] += size
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+from typing import List, Optional, Tuple
+import hashlib
+import json
+import os
+
+from inputer import IntPuter, Pipe, RunState
+
+# Where cached runs are stored unless told otherwise, relative to the working directory
+DEFAULT_DIRECTORY = '.intcache'
+# Total size the cache directory is allowed to grow to before the least recently used runs are evicted
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class RunCache:
+    """
+    An on-disk cache of complete IntPuter runs. A run from a fresh IntPuter is a pure function of the program image, any
+    memory locations patched with set_loc before starting and the inputs queued up front, so those make the key. Each
+    entry holds the outputs, the final memory and registers, and how many of the inputs were used.
+
+    Only runs which halt with all their input queued beforehand are cached. Runs which need more input, fill up a
+    bounded output pipe or stop any other way are left exactly where they stopped, so the caller can carry on with them
+    as normal. Runs which read input from anywhere but the queue, such as an IntPuter with no input pipe prompting on
+    stdin, aren't stored, as the key can't describe that input.
+
+    Entries are small JSON files named after their key. Once the directory grows past max_bytes the least recently
+    used entries are deleted, hits count as a use.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory: str = directory
+        self.max_bytes: int = max_bytes
+        # Number of runs answered from the cache, and run for real, by this instance
+        self.hits: int = 0
+        self.misses: int = 0
+        # Total size of the entries in bytes, as last counted by evict and kept up to date by store. None until the
+        # directory has been counted.
+        self.size: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def patches(computer: IntPuter) -> List[Tuple[int, int]]:
+        """
+        The memory locations which differ from the program image, as (address, value) pairs.
+        """
+        image = computer.program.image
+        memory = computer.code[:]
+        patches = [(addr, val) for addr, (val, original) in enumerate(zip(memory, image)) if val != original]
+        patches += [(addr, val) for addr, val in enumerate(memory[len(image):], len(image)) if val != 0]
+        return patches
+
+    def key(self, computer: IntPuter) -> str:
+        """
+        The cache key for running the given IntPuter from its current state.
+        """
+        inputs = list(computer.input_pipe.data) if computer.input_pipe is not None else []
+        description = json.dumps([computer.program.digest, self.patches(computer), inputs])
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.json')
+
+    def run(self, computer: IntPuter) -> RunState:
+        """
+        Run the IntPuter, which must be fresh or freshly reset, or replay the result of an identical earlier run. Either
+        way the IntPuter ends up in the same state: the inputs it used are taken from its input pipe, its outputs are
+        added to its output pipe (or printed if it has none) and its memory holds the final values. Returns the reason
+        the run stopped, which is also left in the state attribute.
+        """
+        if computer.ptr != 0 or computer.rel_base != 0 or computer.ended:
+            raise ValueError("Only runs from the start of a program can be cached")
+
+        key = self.key(computer)
+        entry = self.load(key)
+        if entry is not None:
+            self.hits += 1
+            self.replay(computer, entry)
+            return computer.state
+
+        self.misses += 1
+        inputs = len(computer.input_pipe.data) if computer.input_pipe is not None else 0
+        output_pipe = computer.output_pipe
+        if output_pipe is None:
+            # Capture the outputs so they can be stored, and print them afterwards as the IntPuter would have
+            computer.output_pipe = Pipe()
+        skip = len(computer.output_pipe.data)
+        start = computer.instructions
+        io_start = computer.io_count
+        try:
+            state = computer.run_until_blocked()
+        finally:
+            outputs = list(computer.output_pipe.data)[skip:]
+            if output_pipe is None:
+                for val in outputs:
+                    print(val)
+                computer.output_pipe = None
+        if state is not RunState.HALTED:
+            return state
+
+        remaining = len(computer.input_pipe.data) if computer.input_pipe is not None else 0
+        consumed = inputs - remaining
+        # Every I/O instruction which wasn't an output read an input. Any more than came off the queue came from
+        # somewhere else, so the run can't be replayed from the key.
+        if computer.io_count - io_start - len(outputs) != consumed:
+            return state
+        self.store(key, {
+            'outputs': outputs,
+            'memory': list(computer.code[:]),
+            'ptr': computer.ptr,
+            'rel_base': computer.rel_base,
+            'consumed': consumed,
+            'instructions': computer.instructions - start,
+        })
+        return state
+
+    def replay(self, computer: IntPuter, entry: dict) -> None:
+        """
+        Puts the IntPuter into the state recorded in a cache entry.
+        """
+        for _ in range(entry['consumed']):
+            computer.input_pipe.dequeue_nowait()
+        if computer.output_pipe is not None:
+            computer.output_pipe.enqueue_many(entry['outputs'])
+        else:
+            for val in entry['outputs']:
+                print(val)
+
+        memory = entry['memory']
+        computer.check_bounds(len(memory) - 1)
+        for addr, val in enumerate(memory):
+            if computer.code[addr] != val:
+                computer.set_loc(addr, val)
+        computer.ptr = entry['ptr']
+        computer.rel_base = entry['rel_base']
+        computer.ended = True
+        computer.state = RunState.HALTED
+        computer.instructions += entry['instructions']
+
+    def load(self, key: str) -> Optional[dict]:
+        """
+        Returns the cache entry for key, or None if there isn't one. Unreadable entries are treated as missing.
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Mark the entry as recently used
+        os.utime(path)
+        return entry
+
+    def store(self, key: str, entry: dict) -> None:
+        """
+        Writes a cache entry, then evicts old entries if the cache has grown too large. The entry is written to a
+        temporary file and moved into place, so other processes never see half an entry.
+
+        The directory is only listed the first time and whenever the running total passes max_bytes, so filling the
+        cache doesn't get slower as it grows. Entries written by other processes are only counted at those points.
+        """
+        path = self.path(key)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp, 'w') as f:
+            json.dump(entry, f, separators=(',', ':'))
+        os.replace(temp, path)
+        if self.size is None:
+            self.evict()
+        else:
+            self.size += os.path.getsize(path) - replaced
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self) -> None:
+        """
+        Deletes the least recently used entries until the cache fits in max_bytes, and recounts its size.
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+        self.size = total
+
+    def clear(self) -> None:
+        """
+        Deletes every entry in the cache.
+        """
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.directory, name))
+        self.size = 0
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+from concurrent.futures import ProcessPoolExecutor
+from itertools import permutations
+from math import perm
+from typing import Dict, List, Optional, Sequence, Tuple
+import os
+
+from inputer import IntPuter, Network, Pipe, Program, Snapshot
+from intcache import RunCache
+
+# The best signal and the phase settings that produced it
+Result = Tuple[int, Tuple[int, ...]]
+
+# The parallel search splits the permutations into at least this many subtrees per worker, so a worker that finishes
+# early has something left to pick up
+SUBTREES_PER_WORKER = 4
+
+# Phase settings always left free in each subtree, so every subtree still shares prefixes between its permutations
+MIN_SUBTREE_PHASES = 3
+
+# Smaller searches than this are run in this process, where they finish before a pool could start its workers
+PARALLEL_MIN_PERMUTATIONS = 5040
+
+# Per process state, set up by start_worker
+worker: Dict = {}
+
+
+def chain(program: Program, count: int, feedback: bool = False, **options) -> List[IntPuter]:
+    """
+    Builds a chain of IntPuters running the same program, each one's output pipe being the next one's input pipe. With
+    feedback the last one's output pipe is also the first one's input pipe, closing the loop.
+    """
+    pipes = [Pipe() for _ in range(count + 1)]
+    if feedback:
+        pipes[-1] = pipes[0]
+    return [IntPuter(program, pipes[i], pipes[i + 1], **options) for i in range(count)]
+
+
+def best_series(computers: List[IntPuter], phases: Sequence[int], cache: RunCache = None) -> Result:
+    """
+    Finds the phase settings giving the highest signal from amplifiers connected in series. Runs are cached if a cache
+    is given.
+
+    The permutations of phase settings are walked depth first, so each amplifier is run once for every prefix of
+    settings rather than once for every permutation. Permutations sharing a prefix share the outputs of the amplifiers
+    it covers, which takes five amplifiers from 600 runs down to 325.
+    """
+    def walk(depth: int, remaining: Tuple[int, ...], signal: int) -> Result:
+        if depth == len(computers):
+            return signal, ()
+        computer = computers[depth]
+        best: Optional[Result] = None
+        for i, phase in enumerate(remaining):
+            computer.reset()
+            computer.input_pipe.clear()
+            computer.input_pipe.enqueue_many([phase, signal])
+            computer.output_pipe.clear()
+            if cache is not None:
+                cache.run(computer)
+            else:
+                computer.run_until_blocked()
+            result, settings = walk(depth + 1, remaining[:i] + remaining[i + 1:], computer.output_pipe.peek())
+            if best is None or result > best[0]:
+                best = (result, (phase,) + settings)
+        return best
+
+    return walk(0, tuple(phases), 0)
+
+
+def best_feedback(computers: List[IntPuter], phases: Sequence[int], prefix: Sequence[int] = ()) -> Result:
+    """
+    Finds the phase settings giving the highest signal from amplifiers connected in a feedback loop. The last
+    amplifier's output pipe must be the first one's input pipe. Only permutations starting with prefix are tried.
+
+    Like best_series, the permutations are walked depth first. Each amplifier is run as far as it can go on its phase
+    setting and the first outputs of the amplifiers before it, then a snapshot is taken. Every permutation sharing that
+    prefix starts from the snapshots rather than running the start of the chain again, and only the rest of the loop
+    is run on a Network.
+    """
+    network = Network(computers)
+    last = len(computers) - 1
+    # For each amplifier on the current path, its state once it's run as far as it can and the inputs it left unread
+    saved: List[Tuple[Snapshot, List[int]]] = [None] * last
+
+    def walk(depth: int, remaining: Tuple[int, ...], signals: List[int]) -> Result:
+        computer = computers[depth]
+        best: Optional[Result] = None
+        for phase in (prefix[depth],) if depth < len(prefix) else remaining:
+            if depth == last:
+                # The previous permutation ran the whole loop, put the start of the chain back. This refills the first
+                # amplifier's input, which is this amplifier's output, so that mustn't be cleared below.
+                for machine, (snapshot, unread) in zip(computers, saved):
+                    machine.restore(snapshot)
+                    machine.input_pipe.clear()
+                    machine.input_pipe.enqueue_many(unread)
+            else:
+                computer.output_pipe.clear()
+            computer.reset()
+            computer.input_pipe.clear()
+            computer.input_pipe.enqueue(phase)
+            computer.input_pipe.enqueue_many(signals)
+            computer.run_until_blocked()
+
+            if depth == last:
+                network.run()
+                result, settings = computer.output_pipe.peek(), ()
+            else:
+                saved[depth] = (computer.snapshot(), list(computer.input_pipe.data))
+                rest = tuple(p for p in remaining if p != phase)
+                result, settings = walk(depth + 1, rest, computer.output_pipe.drain())
+            if best is None or result > best[0]:
+                best = (result, (phase,) + settings)
+        return best
+
+    return walk(0, tuple(phases), [0])
+
+
+def start_worker(program: Program, count: int, options: dict) -> None:
+    """
+    Runs once in each worker process, building the feedback loop it uses for every subtree.
+    """
+    worker['computers'] = chain(program, count, feedback=True, **options)
+
+
+def search_subtree(phases: Sequence[int], prefix: Tuple[int, ...]) -> Result:
+    return best_feedback(worker['computers'], phases, prefix)
+
+
+def split_depth(count: int, workers: int) -> int:
+    """
+    Picks how many leading phase settings to fix for each subtree, the fewest giving every worker several subtrees.
+    At least MIN_SUBTREE_PHASES are left free, however many workers there are.
+    """
+    depth = 0
+    while depth < count - MIN_SUBTREE_PHASES and perm(count, depth) < workers * SUBTREES_PER_WORKER:
+        depth += 1
+    return depth
+
+
+def best_feedback_parallel(program: Program, phases: Sequence[int], workers: int = None, depth: int = None,
+                           **options) -> Result:
+    """
+    Finds the phase settings giving the highest signal from a feedback loop of one amplifier per phase setting, with
+    the permutations spread over a pool of worker processes. Each worker builds its own loop of IntPuters from the
+    program and searches whole subtrees of permutations sharing a prefix with best_feedback. The result is the same
+    as running best_feedback on a single loop.
+
+    Searches of fewer than PARALLEL_MIN_PERMUTATIONS permutations, such as the 120 for five amplifiers, or with a
+    single worker are run on a single loop in this process instead. Pass workers to use a pool anyway.
+
+    Callers starting a pool from a script must do it under if __name__ == "__main__", as worker processes may import
+    the script again.
+
+    Arguments:
+    workers -- number of worker processes. By default one per CPU, up to the number of subtrees.
+    depth -- length of the prefix fixed for each subtree, picked from the number of phases and workers by default.
+    options -- passed on to the IntPuters in each worker, e.g. compiled=True.
+    """
+    phases = tuple(phases)
+    if workers is None:
+        if perm(len(phases)) < PARALLEL_MIN_PERMUTATIONS:
+            workers = 1
+        else:
+            workers = os.cpu_count() or 1
+    if workers == 1:
+        return best_feedback(chain(program, len(phases), feedback=True, **options), phases)
+    if depth is None:
+        depth = split_depth(len(phases), workers)
+    # More workers than subtrees would only sit idle
+    workers = min(workers, perm(len(phases), depth))
+
+    best: Optional[Result] = None
+    with ProcessPoolExecutor(workers, initializer=start_worker, initargs=(program, len(phases), options)) as executor:
+        prefixes = list(permutations(phases, depth))
+        # Results come back in prefix order, so ties go to the first permutation as they would on a single loop
+        for result in executor.map(search_subtree, [phases] * len(prefixes), prefixes):
+            if best is None or result[0] > best[0]:
+                best = result
+    return best
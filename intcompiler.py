@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+from typing import Callable, Dict, List, Optional, Tuple
+
+# A compiled block: the generated function, or None if no block can start at the address, the number of instructions
+# in the block and the raw memory cells it was compiled from.
+Block = Tuple[Optional[Callable], int, Tuple[int, ...]]
+
+# Longest run of instructions compiled into a single block. Keeps blocks within two memory pages.
+MAX_BLOCK_INSTRUCTIONS = 64
+
+# Placeholder for the end address of a block in code emitted before the end is known
+END_MARKER = 'END_OF_BLOCK'
+
+# OpCodes the compiler understands. Input, Output and Stop are left to the interpreter.
+COMPILED_OPCODES = (1, 2, 5, 6, 7, 8, 9)
+
+
+class BlockCompiler:
+    """
+    Compiles a basic block of IntCode, starting at a given address, into a Python function. The block runs straight
+    through Add, Multiply, Less Than, Equals and Update Relative Base instructions and ends after a jump, or just before
+    any instruction it can't compile (I/O, Stop, unknown OpCodes or parameter modes).
+
+    The generated function takes the IntPuter, runs the block with all operands inlined and returns the address of the
+    next instruction to run. Every write checks whether it landed inside cached code, in which case it invalidates the
+    cache. If the write modified the block itself it returns straight away, so the modified code is never run from a
+    stale block.
+    """
+
+    def __init__(self, memory, start: int, sizes: Dict[int, int]):
+        self.memory = memory
+        self.start: int = start
+        # Instruction sizes by OpCode, for the OpCodes in COMPILED_OPCODES
+        self.sizes: Dict[int, int] = sizes
+        self.lines: List[str] = []
+        # Highest absolute address used by the block, so memory can be grown once on entry
+        self.max_addr: int = -1
+        # Whether the block has changed the relative base and needs to store it on exit
+        self.rel_base_changed: bool = False
+        # Counter for naming temporary address variables
+        self.temps: int = 0
+        # Current indentation level of emitted code
+        self.indent: int = 1
+
+    def emit(self, line: str, nested: int = 0) -> None:
+        self.lines.append('    ' * (self.indent + nested) + line)
+
+    def exit(self, target: str) -> None:
+        """
+        Emit the code to leave the block, continuing at target.
+        """
+        if self.rel_base_changed:
+            self.emit('vm.rel_base = rb')
+        self.emit('return {}'.format(target))
+
+    def address(self, mode: int, value: int) -> str:
+        """
+        Emit any code needed to compute a non-immediate address and return an expression for it.
+        """
+        if mode == 0:
+            self.max_addr = max(self.max_addr, value)
+            return str(value)
+        self.temps += 1
+        name = 'a{}'.format(self.temps)
+        self.emit('{} = rb + {}'.format(name, value))
+        self.emit('if {} >= len(m):'.format(name))
+        self.emit('vm.check_bounds({})'.format(name), 1)
+        return name
+
+    def load(self, mode: int, value: int) -> str:
+        """
+        Return an expression loading an operand.
+        """
+        if mode == 1:
+            return str(value)
+        return 'm[{}]'.format(self.address(mode, value))
+
+    def store(self, mode: int, value: int, expression: str, next_ptr: int, overflow: bool, count: int) -> None:
+        """
+        Emit code storing the result of an instruction. A write landing in cached code invalidates it, and if it lands
+        in this block the block is left early, recording count, the number of instructions completed. Writes to other
+        code can't change what the block does next, so it carries on. If the result could overflow a 64 bit memory
+        array, the store promotes memory to a list and tries again.
+        """
+        addr = self.address(mode, value)
+        if overflow:
+            self.emit('try:')
+            self.emit('m[{}] = {}'.format(addr, expression), 1)
+            self.emit('except OverflowError:')
+            self.emit('vm.promote()', 1)
+            self.emit('m = vm.code', 1)
+            self.emit('m[{}] = {}'.format(addr, expression), 1)
+        else:
+            self.emit('m[{}] = {}'.format(addr, expression))
+        self.emit('if {} in cells:'.format(addr))
+        self.emit('vm.invalidate({})'.format(addr), 1)
+        # The end of the block isn't known yet, it's filled in once the block is compiled
+        self.emit('if {} <= {} < {}:'.format(self.start, addr, END_MARKER), 1)
+        if self.rel_base_changed:
+            self.emit('vm.rel_base = rb', 2)
+        self.emit('vm.exited_early = {}'.format(count), 2)
+        self.emit('return {}'.format(next_ptr), 2)
+
+    def decode(self, addr: int) -> Optional[Tuple[int, List[Tuple[int, int]]]]:
+        """
+        Decode the instruction at addr, returning None if it can't be compiled.
+        """
+        if not 0 <= addr < len(self.memory):
+            return None
+        instruction = self.memory[addr]
+        op_code = instruction % 100
+        size = self.sizes.get(op_code)
+        if size is None or addr + size > len(self.memory):
+            return None
+        modes = [(instruction // (10 ** (x + 2))) % 10 for x in range(size - 1)]
+        if any(mode not in (0, 1, 2) for mode in modes):
+            return None
+        # Writing in immediate mode is an error, leave it to the interpreter to raise it
+        if size == 4 and modes[2] == 1:
+            return None
+        return op_code, list(zip(modes, self.memory[addr + 1:addr + size]))
+
+    def compile(self) -> Block:
+        """
+        Compile the block, returning the function, its instruction count and the raw cells it covers.
+        """
+        ptr = self.start
+        count = 0
+        for _ in range(MAX_BLOCK_INSTRUCTIONS):
+            decoded = self.decode(ptr)
+            if decoded is None:
+                break
+            op_code, params = decoded
+            count += 1
+            next_ptr = ptr + len(params) + 1
+            self.emit('# {}: {}'.format(ptr, list(self.memory[ptr:next_ptr])))
+            if op_code in (1, 2, 7, 8):
+                o1, o2 = self.load(*params[0]), self.load(*params[1])
+                expression = {
+                    1: '{} + {}',
+                    2: '{} * {}',
+                    7: '1 if {} < {} else 0',
+                    8: '1 if {} == {} else 0',
+                }[op_code].format(o1, o2)
+                self.store(*params[2], expression, next_ptr, op_code in (1, 2), count)
+            elif op_code == 9:
+                self.emit('rb += {}'.format(self.load(*params[0])))
+                self.rel_base_changed = True
+            else:
+                test = self.load(*params[0])
+                self.emit(('if {}:' if op_code == 5 else 'if not {}:').format(test))
+                # The target is only loaded if the jump is taken
+                self.indent += 1
+                self.exit(self.load(*params[1]))
+                self.indent -= 1
+                ptr = next_ptr
+                break
+            ptr = next_ptr
+
+        if ptr == self.start:
+            # Nothing compiled, the instruction here is left to the interpreter
+            return None, 0, tuple(self.memory[self.start:self.start + 1])
+
+        self.exit(str(ptr))
+        prologue = [
+            'def block(vm):',
+            '    m = vm.code',
+            '    rb = vm.rel_base',
+            '    cells = vm.cached_cells',
+        ]
+        if self.max_addr >= 0:
+            prologue += [
+                '    if len(m) <= {}:'.format(self.max_addr),
+                '        vm.check_bounds({})'.format(self.max_addr),
+            ]
+        source = '\n'.join(prologue + self.lines).replace(END_MARKER, str(ptr))
+        namespace = {}
+        exec(compile(source, '<intcode block {}>'.format(self.start), 'exec'), namespace)
+        return namespace['block'], count, tuple(self.memory[self.start:ptr])
+
+
+def compile_block(memory, start: int, sizes: Dict[int, int]) -> Block:
+    """
+    Compile the basic block starting at start into a Python function. sizes maps the OpCodes in COMPILED_OPCODES to
+    their instruction sizes. See BlockCompiler.
+    """
+    return BlockCompiler(memory, start, sizes).compile()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from math import prod
+from multiprocessing import Value
+from typing import Dict, Optional, Sequence, Tuple
+import os
+
+from inputer import IntPuter, Pipe, Program, RunState
+
+# Each worker is given about this many chunks, so a worker that finishes early has something left to pick up
+CHUNKS_PER_WORKER = 8
+
+# Largest chunk handed to a worker, so the chunks ahead of a match finish soon after it's found and the search can stop
+MAX_CHUNK_SIZE = 4096
+
+# Per process state, set up by start_worker
+worker: Dict = {}
+
+
+def start_worker(program: Program, addresses: Sequence[int], domains: Sequence[Sequence[int]], result: int,
+                 target: int, max_instructions: int, found, options: dict) -> None:
+    """
+    Runs once in each worker process, building the IntPuter it uses for every chunk.
+    """
+    worker.update(
+        computer=IntPuter(program, Pipe(), Pipe(), **options),
+        addresses=addresses,
+        domains=domains,
+        result=result,
+        target=target,
+        max_instructions=max_instructions,
+        found=found,
+    )
+
+
+def values_at(domains: Sequence[Sequence[int]], index: int) -> Tuple[int, ...]:
+    """
+    The values at the given position in product(*domains) order.
+    """
+    values = []
+    for domain in reversed(domains):
+        index, i = divmod(index, len(domain))
+        values.append(domain[i])
+    return tuple(reversed(values))
+
+
+def search_chunk(start: int, stop: int) -> Optional[int]:
+    """
+    Tries every combination from start up to stop in product order, returning the index of the first that matches. Gives
+    up as soon as another worker has found an earlier match.
+    """
+    computer: IntPuter = worker['computer']
+    found = worker['found']
+    for index in range(start, stop):
+        # An earlier match means nothing in the rest of this chunk can be the first
+        if found.value < index:
+            return None
+        computer.reset()
+        computer.output_pipe.clear()
+        for address, value in zip(worker['addresses'], values_at(worker['domains'], index)):
+            computer.set_loc(address, value)
+        try:
+            state = computer.run_until_blocked(worker['max_instructions'])
+        except Exception:
+            # Crashed on these values, so they can't be the answer
+            continue
+        if state == RunState.HALTED and computer.code[worker['result']] == worker['target']:
+            with found.get_lock():
+                found.value = min(found.value, index)
+            return index
+    return None
+
+
+def chunk_size(total: int, workers: int) -> int:
+    """
+    Picks the chunk size for a search. Small searches are split finely so every worker has something to do, large ones
+    are capped so a match cancels the rest of the work quickly.
+    """
+    return max(1, min(MAX_CHUNK_SIZE, total // (workers * CHUNKS_PER_WORKER)))
+
+
+def search_patch(program: Program, addresses: Sequence[int], result: int, target: int,
+                 domains: Sequence[Sequence[int]], workers: int = None, size: int = None,
+                 max_instructions: int = 100000, **options) -> Optional[Tuple[int, ...]]:
+    """
+    Finds the values to patch into the given addresses to make the program halt with target at the result address, by
+    running every combination on a pool of worker processes. Returns the first solution in product(*domains) order, the
+    same one a sequential search would find, or None if there is none.
+
+    The combinations are split into chunks which are handed to the workers in order. The first match cancels every
+    chunk after it, while the chunks before it are still finished in case one of them holds an earlier match.
+
+    Arguments:
+    workers -- number of worker processes, one per CPU by default.
+    size -- number of combinations in each chunk, picked from the size of the search by default.
+    max_instructions -- combinations which run for longer than this are assumed to loop forever.
+    options -- passed on to the IntPuter in each worker, e.g. compiled=True.
+    """
+    total = prod(len(domain) for domain in domains)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if size is None:
+        size = chunk_size(total, workers)
+
+    # Index of the earliest match so far, shared with the workers. total means nothing has matched yet.
+    found = Value('q', total)
+    with ProcessPoolExecutor(workers, initializer=start_worker, initargs=(
+            program, addresses, domains, result, target, max_instructions, found, options
+    )) as executor:
+        pending: Dict[Future, int] = {
+            executor.submit(search_chunk, start, min(start + size, total)): start
+            for start in range(0, total, size)
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                if future.result() is not None:
+                    # Chunks after the match can't hold an earlier one, cancel those that haven't started
+                    for later, start in list(pending.items()):
+                        if start > found.value and later.cancel():
+                            del pending[later]
+
+    return values_at(domains, found.value) if found.value < total else None
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+from collections import deque
+from itertools import product
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from inputer import IntPuter, Program
+
+# Instruction sizes by OpCode, Stop is handled separately
+SIZES = {op_code: instr['size'] for op_code, instr in IntPuter.INSTRUCTIONS.items() if op_code != 99}
+
+
+class Unsupported(Exception):
+    """
+    The program did something the symbolic evaluator can't follow, like branching on a symbol or writing to an address
+    that depends on one. The answer has to be found by running the program for real.
+    """
+
+
+class Unknown:
+    """
+    A value which depends on the symbols in a way that can't be expressed, like a read from an address that depends on
+    a symbol. Harmless unless it's used for something that matters, which raises Unsupported.
+    """
+
+    def __repr__(self) -> str:
+        return 'UNKNOWN'
+
+
+UNKNOWN = Unknown()
+
+
+class Expression:
+    """
+    A polynomial in the symbols with integer coefficients. Terms are stored as a dictionary mapping each monomial, a
+    tuple with the power of every symbol, to its coefficient. Expressions with no symbols left in them are simplified
+    back to plain ints, see simplify.
+    """
+
+    def __init__(self, terms: Dict[Tuple[int, ...], int], count: int):
+        self.terms: Dict[Tuple[int, ...], int] = {monomial: c for monomial, c in terms.items() if c}
+        # Number of symbols, the length of every monomial
+        self.count: int = count
+
+    @classmethod
+    def symbol(cls, index: int, count: int) -> 'Expression':
+        return cls({tuple(1 if x == index else 0 for x in range(count)): 1}, count)
+
+    def lift(self, other: Union[int, 'Expression']) -> 'Expression':
+        if isinstance(other, Expression):
+            return other
+        return Expression({(0,) * self.count: other}, self.count)
+
+    def __add__(self, other: Union[int, 'Expression']) -> 'Expression':
+        terms = dict(self.terms)
+        for monomial, c in self.lift(other).terms.items():
+            terms[monomial] = terms.get(monomial, 0) + c
+        return Expression(terms, self.count)
+
+    __radd__ = __add__
+
+    def __neg__(self) -> 'Expression':
+        return Expression({monomial: -c for monomial, c in self.terms.items()}, self.count)
+
+    def __sub__(self, other: Union[int, 'Expression']) -> 'Expression':
+        return self + -self.lift(other)
+
+    def __rsub__(self, other: int) -> 'Expression':
+        return -self + other
+
+    def __mul__(self, other: Union[int, 'Expression']) -> 'Expression':
+        terms = {}
+        other = self.lift(other)
+        for m1, c1 in self.terms.items():
+            for m2, c2 in other.terms.items():
+                monomial = tuple(a + b for a, b in zip(m1, m2))
+                terms[monomial] = terms.get(monomial, 0) + c1 * c2
+        return Expression(terms, self.count)
+
+    __rmul__ = __mul__
+
+    def evaluate(self, values: Sequence[int]) -> int:
+        """
+        The value of the expression with every symbol replaced by a value.
+        """
+        total = 0
+        for monomial, c in self.terms.items():
+            for val, power in zip(values, monomial):
+                c *= val ** power
+            total += c
+        return total
+
+    def partial(self, values: Sequence[int]) -> List[int]:
+        """
+        Replaces every symbol but the last with a value, returning the coefficients of the polynomial left in the last
+        symbol, lowest power first.
+        """
+        coefficients = [0]
+        for monomial, c in self.terms.items():
+            for val, power in zip(values, monomial):
+                c *= val ** power
+            power = monomial[-1]
+            if power >= len(coefficients):
+                coefficients.extend([0] * (power - len(coefficients) + 1))
+            coefficients[power] += c
+        return coefficients
+
+    def __repr__(self) -> str:
+        terms = []
+        for monomial, c in sorted(self.terms.items(), reverse=True):
+            factors = [
+                'x{}'.format(x) if power == 1 else 'x{}^{}'.format(x, power)
+                for x, power in enumerate(monomial) if power
+            ]
+            terms.append('*'.join(([str(c)] if c != 1 or not factors else []) + factors))
+        return ' + '.join(terms) or '0'
+
+
+Value = Union[int, Expression, Unknown]
+
+
+def simplify(val: Value) -> Value:
+    """
+    Turns expressions without any symbols left in them back into ints.
+    """
+    if isinstance(val, Expression) and not any(any(monomial) for monomial in val.terms):
+        return sum(val.terms.values())
+    return val
+
+
+class SymbolicPuter:
+    """
+    Runs an IntCode program with some memory cells holding symbols instead of values. Arithmetic on symbols builds up
+    expressions, so after a single run any memory cell or output can be read back as a polynomial in the symbols.
+
+    This only works as long as the path through the program doesn't depend on the symbols. Jumping on a symbol,
+    comparing one unless the answer is the same for every value, running code built from one, or writing to an address
+    computed from one all raise Unsupported. Reading from such an address is fine, the value read is UNKNOWN and only
+    raises Unsupported if it's used for something that matters. The address must not be negative for the run to be
+    valid though, which is recorded in constraints.
+    """
+
+    def __init__(self, program: Program, symbols: Sequence[int], inputs: Iterable[int] = ()):
+        self.memory: List[Value] = list(program.image)
+        self.ptr: int = 0
+        self.rel_base: Value = 0
+        self.ended: bool = False
+        self.inputs: Deque[int] = deque(inputs)
+        self.outputs: List[Value] = []
+        # Expressions which must not be negative for the run to be valid
+        self.constraints: List[Expression] = []
+        for index, addr in enumerate(symbols):
+            self.write(addr, Expression.symbol(index, len(symbols)))
+
+    def read(self, addr: Value) -> Value:
+        if isinstance(addr, Expression):
+            self.constraints.append(addr)
+            return UNKNOWN
+        if addr is UNKNOWN:
+            raise Unsupported("Read from an unknown address")
+        if addr < 0:
+            raise Unsupported("Read from negative address {}".format(addr))
+        if addr >= len(self.memory):
+            return 0
+        return self.memory[addr]
+
+    def write(self, addr: Value, val: Value) -> None:
+        if not isinstance(addr, int):
+            raise Unsupported("Write to an address which depends on the symbols")
+        if addr < 0:
+            raise Unsupported("Write to negative address {}".format(addr))
+        if addr >= len(self.memory):
+            self.memory.extend([0] * (addr - len(self.memory) + 1))
+        self.memory[addr] = val
+
+    def concrete(self, val: Value, what: str) -> int:
+        if not isinstance(val, int):
+            raise Unsupported("{} at {} depends on the symbols".format(what, self.ptr))
+        return val
+
+    def run(self, max_instructions: int = 1000000) -> None:
+        """
+        Runs the program until it halts. Raises Unsupported if the run can't be followed symbolically, runs out of
+        input, or doesn't halt within max_instructions.
+        """
+        for _ in range(max_instructions):
+            instruction = self.concrete(self.read(self.ptr), 'Instruction')
+            op_code = instruction % 100
+            if op_code == 99:
+                self.ended = True
+                return
+            size = SIZES.get(op_code)
+            if size is None:
+                raise Unsupported("Unknown OpCode {} at {}".format(op_code, self.ptr))
+
+            params = []
+            for x in range(size - 1):
+                mode = (instruction // (10 ** (x + 2))) % 10
+                val = self.read(self.ptr + x + 1)
+                if mode == 1:
+                    params.append((None, val))
+                elif mode == 0:
+                    params.append((val, None))
+                elif mode == 2:
+                    if val is UNKNOWN or self.rel_base is UNKNOWN:
+                        params.append((UNKNOWN, None))
+                    else:
+                        params.append((simplify(self.rel_base + val), None))
+                else:
+                    raise Unsupported("Unknown parameter mode {} at {}".format(mode, self.ptr))
+
+            def load(x: int) -> Value:
+                addr, val = params[x]
+                return val if addr is None else self.read(addr)
+
+            def result(val: Value) -> None:
+                addr, _ = params[-1]
+                if addr is None:
+                    raise Unsupported("Write in immediate mode at {}".format(self.ptr))
+                self.write(addr, val)
+
+            next_ptr = self.ptr + size
+            if op_code in (1, 2):
+                a, b = load(0), load(1)
+                if a is UNKNOWN or b is UNKNOWN:
+                    result(UNKNOWN)
+                else:
+                    result(simplify(a + b if op_code == 1 else a * b))
+            elif op_code in (7, 8):
+                a, b = load(0), load(1)
+                difference = UNKNOWN if a is UNKNOWN or b is UNKNOWN else simplify(a - b)
+                difference = self.concrete(difference, 'Comparison')
+                result(int(difference < 0 if op_code == 7 else difference == 0))
+            elif op_code == 3:
+                if not self.inputs:
+                    raise Unsupported("Ran out of input at {}".format(self.ptr))
+                result(self.inputs.popleft())
+            elif op_code == 4:
+                self.outputs.append(load(0))
+            elif op_code in (5, 6):
+                test = self.concrete(load(0), 'Jump condition')
+                if (test != 0) == (op_code == 5):
+                    next_ptr = self.concrete(load(1), 'Jump target')
+            else:
+                offset = load(0)
+                if offset is UNKNOWN or self.rel_base is UNKNOWN:
+                    self.rel_base = UNKNOWN
+                else:
+                    self.rel_base = simplify(self.rel_base + offset)
+            self.ptr = next_ptr
+        raise Unsupported("Didn't halt within {} instructions".format(max_instructions))
+
+
+def solve(val: Value, target: int, domains: Sequence[Sequence[int]],
+          constraints: Sequence[Expression] = ()) -> Optional[Tuple[int, ...]]:
+    """
+    Finds values for the symbols, each taken from its domain, which make val equal target and keep every constraint
+    non-negative. Returns the first solution in the order product(*domains) would produce it, or None.
+
+    Every symbol but the last is searched, but for each combination of those the polynomial left in the last symbol is
+    solved directly when it's linear, so a two symbol search is linear in the size of the domains rather than
+    quadratic. Higher powers fall back to searching the last domain.
+    """
+    if val is UNKNOWN:
+        raise Unsupported("The result depends on the symbols in an unknown way")
+
+    def valid(values: Tuple[int, ...]) -> bool:
+        return all(constraint.evaluate(values) >= 0 for constraint in constraints)
+
+    if not isinstance(val, Expression):
+        if val != target:
+            return None
+        return next((values for values in product(*domains) if valid(values)), None)
+
+    *outer, last = domains
+    for values in product(*outer):
+        coefficients = val.partial(values)
+        while len(coefficients) > 1 and not coefficients[-1]:
+            coefficients.pop()
+        if len(coefficients) == 1:
+            candidates = last if coefficients[0] == target else ()
+        elif len(coefficients) == 2:
+            x, remainder = divmod(target - coefficients[0], coefficients[1])
+            candidates = (x,) if not remainder and x in last else ()
+        else:
+            candidates = (x for x in last if sum(c * x ** p for p, c in enumerate(coefficients)) == target)
+        for x in candidates:
+            if valid(values + (x,)):
+                return values + (x,)
+    return None
+
+
+def solve_patch(program: Program, addresses: Sequence[int], result: int, target: int,
+                domains: Sequence[Sequence[int]]) -> Optional[Tuple[int, ...]]:
+    """
+    Finds the values to patch into the given addresses to make the program halt with target at the result address,
+    with a single symbolic run. Returns the first solution in product(*domains) order, or None if there is none. Raises
+    Unsupported if the program can't be run symbolically, in which case it has to be searched the slow way.
+    """
+    machine = SymbolicPuter(program, addresses)
+    machine.run()
+    return solve(machine.read(result), target, domains, machine.constraints)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+from itertools import product
+
+from inputer import IntPuter, Pipe, Program
+from intbatch import BatchPuter, BatchState
+
+# Adds the cells addressed by the noun and verb, and triples the sum for nouns of 3 or more. The batch splits at the
+# branch and merges again at the output.
+SWEEP = Program("1,0,0,19,1007,1,3,20,1005,20,15,1002,19,3,19,4,19,99,0,0,0")
+
+
+def test_product_just_past_64_bits_overflows():
+    # 9087066046162341 * 1015 is just over 2 ** 63, close enough that the floating point product rounds below it
+    batch = BatchPuter(Program("1102,9087066046162341,1015,7,4,7,99,0"), 1)
+    batch.run()
+    assert batch.state[0] == BatchState.OVERFLOW
+    assert batch.outputs[0] == []
+
+
+def test_products_at_the_64_bit_limits():
+    results = {}
+    for a, b in ((-2 ** 63, -1), (-2 ** 63, 1), (2 ** 62, -2), (2 ** 62, 2), (3037000499, 3037000499)):
+        batch = BatchPuter(Program("1102,{},{},7,4,7,99,0".format(a, b)), 1)
+        batch.run()
+        results[a, b] = BatchState(batch.state[0]), batch.outputs[0]
+    assert results == {
+        (-2 ** 63, -1): (BatchState.OVERFLOW, []),
+        (-2 ** 63, 1): (BatchState.HALTED, [-2 ** 63]),
+        (2 ** 62, -2): (BatchState.HALTED, [-2 ** 63]),
+        (2 ** 62, 2): (BatchState.OVERFLOW, []),
+        (3037000499, 3037000499): (BatchState.HALTED, [3037000499 ** 2]),
+    }
+
+
+def test_sweep_matches_intputer():
+    pairs = list(product(range(6), repeat=2))
+    batch = BatchPuter(SWEEP, len(pairs))
+    batch.set_loc(1, [noun for noun, verb in pairs])
+    batch.set_loc(2, [verb for noun, verb in pairs])
+    batch.run()
+
+    assert (batch.state == BatchState.HALTED).all()
+    computer = IntPuter(SWEEP, Pipe(), Pipe())
+    for row, (noun, verb) in enumerate(pairs):
+        computer.reset()
+        computer.set_loc(1, noun)
+        computer.set_loc(2, verb)
+        computer.run()
+        assert batch.outputs[row] == computer.output_pipe.drain()
+        assert list(batch.memory[row, :len(computer.code)]) == list(computer.code)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+import builtins
+import os
+
+from inputer import IntPuter, Pipe, RunState
+from intcache import RunCache
+
+# Doubles its input
+DOUBLE = "3,9,1002,9,2,9,4,9,99,0"
+
+
+def test_queued_input_is_cached(tmp_path):
+    cache = RunCache(str(tmp_path))
+    for _ in range(2):
+        computer = IntPuter(DOUBLE, Pipe(), Pipe())
+        computer.input_pipe.enqueue(21)
+        assert cache.run(computer) is RunState.HALTED
+        assert computer.output_pipe.drain() == [42]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_stdin_input_is_not_cached(tmp_path, monkeypatch, capsys):
+    cache = RunCache(str(tmp_path))
+    for val in (21, 5):
+        monkeypatch.setattr(builtins, 'input', lambda prompt='': str(val))
+        computer = IntPuter(DOUBLE, None, None)
+        assert cache.run(computer) is RunState.HALTED
+        assert capsys.readouterr().out.split() == [str(val * 2)]
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert not [name for name in os.listdir(str(tmp_path)) if name.endswith('.json')]